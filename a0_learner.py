@@ -1,6 +1,7 @@
 
-from automaton import Automaton, Node
-from re_parser import REParser
+from automaton import Automaton, duplicates, flagged
+from prefix_tree import PrefixTree
+from stats import NULL_STATS
 
 class A0Learner:
     """
@@ -17,24 +18,26 @@ class A0Learner:
 
     """
 
-    def __init__(self, examples=None, automaton=None):
+    def __init__(self, examples=None, automaton=None, stats=None):
         """
         :args:
             automaton   - (optional) instance of Automaton class
-            examples    - list of strings, this can include the empty string ('')
+            examples    - list of strings (this can include the empty string ''),
+                          or instance of PrefixTree
+            stats       - (optional) instance of stats.Stats
         """
+        self.stats = stats if stats else NULL_STATS
         self.A = automaton if automaton else Automaton()
-        self.S = sorted( set(examples) )
-        self.Σ = { char for s in self.S for char in s }
+        self.T = examples if isinstance(examples, PrefixTree) else PrefixTree(examples or [])
+        # Symbols of the automaton, by symbol of the prefix tree
+        self.Σ = self.A.add_symbols(self.T.alphabet)
         # If empty string is accepted, make root accepting state
         self.root = self.A.add_node(
                 is_initial=True, 
-                is_final=True if self.S[0] == '' else False 
+                is_final=bool(self.T.final[0])
                 )
-        # Drop empty string from list of examples
-        if self.S[0] == '':
-            self.S = self.S[1:]
         self.verbose = False
+        self.learned = False
 
 
     def learn(self, verbose=True):
@@ -51,55 +54,63 @@ class A0Learner:
         self.verbose = verbose
 
         # Create prefix tree
-        self.construct_prefix_tree()
+        with self.stats.stage('construct_prefix_tree'):
+            self.construct_prefix_tree()
+        self.stats.count('states_created', len(self.A.nodes))
         if verbose:
             self.A.show(title='Prefix Tree')
 
         # Merge final states
-        self.merge_final_states()
+        with self.stats.stage('merge_final_states'):
+            self.merge_final_states()
         if verbose:
             self.A.show(title='Prefix Tree after merging final states')
 
         # Merge non-deterministic transitions
-        self.merge_nd_edges()
+        with self.stats.stage('merge_nd_edges'):
+            self.merge_nd_edges()
+            self.A.compact()
+        self.stats.count('states', len(self.A.nodes))
+        self.learned = True
         if verbose:
             self.A.show(title='Automaton with merged non-deterministic transitions')
 
 
+    def add_examples(self, examples):
+        """
+        Add examples to the learned automaton. This reference implementation
+        learns a new automaton from all examples (see ZRLearner for an
+        incremental update). Before learn() is called, the examples are only
+        added to the prefix tree.
+
+        :args:
+            examples    - iterable of strings
+        :returns:
+            automaton   - the learned Automaton
+        """
+        for s in examples:
+            self.T.insert(s)
+        if self.learned:
+            self.A = Automaton()
+            self.root = self.A.add_node(is_initial=True, is_final=bool(self.T.final[0]))
+            self.learn(verbose=False)
+        self.Σ = self.A.add_symbols(self.T.alphabet)
+        return self.A
+
+
     def construct_prefix_tree(self):
         """
         Create a prefix tree that exactly matches with the list of examples.
-        To avoid creating duplicate paths (i.e. node-edge sequences with the same labels),
-        we keep track of the previous path and add new labels for the next strings
-        only continuing from the longest matching point.
+        The examples are already stored in a PrefixTree (without duplicate
+        paths), so we only have to add its states and edges to the automaton.
         """
-
-        # List of label-node tuples, used to keep track the previous path.
-        # (This guarantees we will not create duplicate paths, since the list of
-        # examples is alphabetically sorted!)
-        prefix_path = []
-
-        for s in self.S:
-            # First, find the longest match with the previous prefix path, to continue from there
-            i=0
-            for i in range( min( len(s), len(prefix_path) ) ):
-                if s[i] != prefix_path[i][0]:
-                   break
-            prefix_path = prefix_path[:i]
-
-            # Continue from the last matching point
-            # Add new nodes to the last node in the prefix path
-            for i in range( len(prefix_path), len(s) ):
-                prev_node = prefix_path[-1][1] if prefix_path else self.root
-                # Add last character in s as an accepting state
-                new_node = self.A.add_node( is_final=True if i+1==len(s) else False )
-                self.A.add_edge( prev_node, new_node, s[i])
-                prefix_path.append( (s[i], new_node) )
+        self.T.to_automaton(self.A, self.root)
 
 
     def merge_final_states(self):
         if self.verbose:
             print(f'Merging {len(self.A.accepting_nodes)} final states into one.')
+        self.stats.count('merges', max(len(self.A.accepting_nodes) - 1, 0))
         self.A.merge_nodes( list(self.A.accepting_nodes) )
 
 
@@ -111,30 +122,12 @@ class A0Learner:
         (respectively incoming) transitions with the same label to (from) a 
         set of nodes n1, n2 ... nk such that k>1, then those are nd.
 
-        Find nd-edges in the automaton and merge the associated nodes. Repeat
+        Find nodes with incoming nd-edges and merge their sources. Repeat
         same process as long as there were nd-transitions found during
         last iteration.
         """
 
-        # Merge outgoing nd-transitions
-        still_nd = True
-        while still_nd:
-            if self.verbose:
-                print('Finding and merging outgoing nd-edges.')
-            still_nd = False
-            for n in list(self.A.nodes):
-                if n.index in self.A.deleted_indices:
-                    continue
-                for char in self.Σ:
-                    nd_children = []
-                    for c in list(self.A.nodes):
-                        if c.index in self.A.deleted_indices:
-                            continue
-                        if char in self.A.edges[c.index][n.index]:
-                            nd_children.append(c)
-                    if len(nd_children) > 1:
-                        self.A.merge_nodes(nd_children)
-                        still_nd = True
+        scans = merges = 0
 
         # Merge incoming nd-transitions
         still_nd = True
@@ -142,19 +135,38 @@ class A0Learner:
             if self.verbose:
                 print('Finding and merging incoming nd-edges.')
             still_nd = False
-            for n in list(self.A.nodes):
-                if n.index in self.A.deleted_indices:
-                    continue
-                for char in self.Σ:
-                    nd_parents = []
-                    for p in list(self.A.nodes):
-                        if p.index in self.A.deleted_indices:
-                            continue
-                        if char in self.A.edges[p.index][n.index]:
-                            nd_parents.append(p)
-                    if len(nd_parents) > 1:
-                        self.A.merge_nodes(nd_parents)
-                        still_nd = True
+            scans += 1
+            for k in flagged(self.A.live):
+                n_merges = self.merge_nd_sources(k)
+                if n_merges:
+                    still_nd = True
+                    merges += n_merges
+
+        self.stats.count('merge_scan_iterations', scans)
+        self.stats.count('merges', merges)
+
+
+    def merge_nd_sources(self, k):
+        """
+        Merge the sources of edges with the same label to node k. The labels
+        of the edges from each source are a bitmask, so the labels on edges
+        from more than one source are found with a few bit operations.
+
+        :returns:
+            merges      - number of merged nodes
+        """
+        merges = 0
+        # Node k might be merged during previous iteration
+        while self.A.live[k]:
+            incoming = self.A.inc[k]
+            dup = duplicates(incoming.values())
+            if not dup:
+                break
+            a = dup & -dup
+            nd_parents = [i for i, mask in incoming.items() if mask & a]
+            self.A.merge(nd_parents)
+            merges += len(nd_parents) - 1
+        return merges
 
 
     def get_automaton(self):
@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
 
+import os
 import sys
-from a0_learner import A0Learner
-from re_parser import REParser
+from zr_learner import ENGINES
+from prefix_tree import PrefixTree, BytePrefixTree
+from tokenizer import Tokenizer, TOKENIZERS
+from re_parser import REParser, FALLBACKS
+from emitter import emit, DIALECTS
+from elimination_order import ORDERS
+from minimizer import Minimizer
+from automaton import Automaton
+from stats import Stats, NULL_STATS
+from options import get_option, MINIMIZE
 
 if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
     print("""
@@ -12,11 +21,12 @@ if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
     The pipeline consists of these stages:
         * Construct a Prefix Tree from the set of examples,
         * Convert Prefix Tree into Zero-Reversible Automaton,
+        * Minimize Automaton (optional),
         * State-Elimination Algorithm to extract Regex from Automaton,
         * Nested Regexes to simplify final pattern (work in progress).
 
     Requirements:
-        Python packages for drawing graphs:
+        Python packages for drawing graphs (only needed with -v):
         * PyQt5
         * graphviz
 
@@ -24,6 +34,85 @@ if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
         -h              print this message
         -v              draw graphs and print debugging info
         -c              read list of examples from stdin
+        --bytes         read the file as bytes: examples are separated by
+                        the delimiter and not stripped, the alphabet is
+                        the 256 byte values (labels are decoded as latin-1,
+                        emitted patterns are written as latin-1 bytes)
+        --delimiter=SEQ delimiter of the examples with --bytes, escape
+                        sequences like \n, \t or \x00 can be used
+                        (default \n)
+        --mmap          map the file into memory instead of reading it
+                        (with --bytes)
+        --tokenize=MODE learn over tokens instead of characters, one of:
+                            - regex: matches of --token-pattern (default
+                              \w+) and the characters between them,
+                            - delimiter: parts between --token-delimiter
+                              (default space) and the delimiters,
+                            - class: runs of digits and runs of letters
+                              become the classes [0-9]+ and [A-Za-z]+.
+        --token-pattern=RE
+                        regular expression of a token (regex mode)
+        --token-delimiter=SEQ
+                        delimiter of the tokens (delimiter mode)
+        --engine=NAME   learning engine, one of:
+                            - fast: union-find with worklist (default),
+                            - reference: original fixpoint iteration.
+        --minimize=DIR  merge equivalent states before extraction, one of:
+                            - no: don't minimize (default),
+                            - forward: automaton has to be deterministic,
+                            - reverse: minimize reversed automaton,
+                            - auto: forward if possible, else reverse.
+        --order=NAME    order in which states are eliminated, one of:
+                            - list: order of creation (default),
+                            - static: lowest weight first,
+                            - dynamic: lowest weight first, weights
+                              updated after each elimination.
+        --simplify=no   don't simplify the expression during extraction
+        --workers=N     first eliminate the interior states of each strongly
+                        connected component of the automaton, in N processes
+                        (default 0: no decomposition)
+        --time-budget=SEC
+                        time budget of the extraction (0: only the
+                        fallback is computed)
+        --max-label-length=N
+                        budget of the length of each intermediate label
+        --max-length=N  budget of the length of the final expression
+        --fallback=NAME result if a budget is exceeded (reported to stderr),
+                        one of:
+                            - paths: union of the shortest accepted
+                              examples (default),
+                            - alphabet: any string of the labels,
+                            - none: no expression (save the automaton
+                              with --save-automaton instead).
+        -l              print length of the expression to stderr
+        --emit=DIALECT  print the expression as a pattern for a regex engine
+                        (without ϵ, with non-capturing groups and escaped
+                        special characters), one of:
+                            - python: module re,
+                            - pcre: PCRE and compatible engines,
+                            - posix: POSIX extended regular expressions.
+        --anchor=no     don't anchor the emitted pattern to the start and
+                        end of the string
+        --match-benchmark
+                        compare compile time and match throughput of the
+                        expression (with module re) and of the automaton
+                        on the examples, printed to stderr
+        --save-automaton=PATH
+                        write the learned (and minimized) automaton to a
+                        binary file
+        --load-automaton=PATH
+                        read the automaton from a binary file instead of
+                        learning it from examples (no filepath or -c needed)
+        --cache=DIR     cache learned automata and expressions in directory,
+                        keyed by the set of examples and the options
+        --cache-size=MB maximum size of the cache (default 256)
+        --stats=FORMAT  print time and counters of each stage to stderr,
+                        FORMAT is json or text
+        --profile=STAGES
+                        profile stages with cProfile (comma separated
+                        names, or all), the profile is printed to stderr
+        --trace-memory=STAGES
+                        measure peak memory of stages with tracemalloc
         <filepath>      read list of examples from file (incompatible with -c),
                         expected as last argument and:
                             - each line should contain one example,
@@ -36,36 +125,234 @@ if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
     """)
     sys.exit(0)
 
+
 verbose = True if '-v' in sys.argv else False
+if verbose:
+    try:
+        import visualize
+    except ImportError as ex:
+        print(ex)
+        print('Drawing graphs (-v) requires the packages graphviz and PyQt5. Exiting.')
+        sys.exit(1)
+engine = get_option(sys.argv, '--engine', 'fast', ENGINES)
+minimize = get_option(sys.argv, '--minimize', 'no', MINIMIZE)
+order = get_option(sys.argv, '--order', 'list', ORDERS)
+simplify = get_option(sys.argv, '--simplify', 'yes', ('yes', 'no')) == 'yes'
+save_fp = get_option(sys.argv, '--save-automaton')
+load_fp = get_option(sys.argv, '--load-automaton')
+cache_dir = get_option(sys.argv, '--cache')
+stats_format = get_option(sys.argv, '--stats', 'no', ('no', 'json', 'text'))
+profile = get_option(sys.argv, '--profile', '')
+trace_memory = get_option(sys.argv, '--trace-memory', '')
+try:
+    cache_size = int(float(get_option(sys.argv, '--cache-size', '256')) * 2**20)
+    workers = int(get_option(sys.argv, '--workers', '0'))
+    time_budget = get_option(sys.argv, '--time-budget')
+    time_budget = float(time_budget) if time_budget else None
+    max_label_length = int(get_option(sys.argv, '--max-label-length', '0')) or None
+    max_length = int(get_option(sys.argv, '--max-length', '0')) or None
+except ValueError:
+    print('Invalid value for --cache-size, --workers or a budget, expected a number. Exiting.')
+    sys.exit(1)
+fallback = get_option(sys.argv, '--fallback', 'paths', FALLBACKS)
+dialect = get_option(sys.argv, '--emit', None, (None,) + DIALECTS)
+anchor = get_option(sys.argv, '--anchor', 'yes', ('yes', 'no')) == 'yes'
+benchmark_match = '--match-benchmark' in sys.argv
+binary = '--bytes' in sys.argv
+use_mmap = '--mmap' in sys.argv
+delimiter = get_option(sys.argv, '--delimiter')
+if (delimiter is not None or use_mmap) and not binary:
+    print('--delimiter and --mmap are only used with --bytes. Exiting.')
+    sys.exit(1)
+tokenize = get_option(sys.argv, '--tokenize', None, (None,) + TOKENIZERS)
+tokenizer = None
+if tokenize:
+    if binary or benchmark_match:
+        print('--tokenize can\'t be used with --bytes or --match-benchmark. Exiting.')
+        sys.exit(1)
+    token_pattern = get_option(sys.argv, '--token-pattern', r'\w+')
+    token_delimiter = get_option(sys.argv, '--token-delimiter', ' ')
+    try:
+        tokenizer = Tokenizer(tokenize, token_pattern, token_delimiter)
+    except ValueError as ex:
+        print(ex)
+        print('Invalid value for --token-pattern or --token-delimiter. Exiting.')
+        sys.exit(1)
+try:
+    delimiter = delimiter.encode('utf-8').decode('unicode_escape').encode('latin-1') if delimiter else b'\n'
+except ValueError:
+    print('Invalid value for --delimiter, expected bytes (escaped as \\xNN). Exiting.')
+    sys.exit(1)
+if benchmark_match and load_fp:
+    print('The match benchmark needs the examples, it can\'t be used with --load-automaton. Exiting.')
+    sys.exit(1)
+
+stats = NULL_STATS
+if stats_format != 'no' or profile or trace_memory:
+    stats = Stats(
+            profile=[s for s in profile.split(',') if s],
+            memory=[s for s in trace_memory.split(',') if s]
+            )
+
+
+def print_expression(text):
+    if binary and dialect:
+        # Patterns of binary examples match bytes, so they are written as
+        # latin-1 (only POSIX patterns contain characters that aren't ASCII)
+        sys.stdout.flush()
+        sys.stdout.buffer.write( text.encode('latin-1') + b'\n' )
+        sys.stdout.flush()
+    else:
+        print(text)
+
+
+def print_stats():
+    if not stats.enabled:
+        return
+    if stats_format == 'json':
+        print(stats.to_json(), file=sys.stderr)
+    elif stats_format == 'text':
+        print(stats.to_text(), file=sys.stderr)
+    if stats.profiles:
+        print(stats.profile_text(), file=sys.stderr)
+
 
 # Try to open file with examples
-if '-c' not in sys.argv:
+if load_fp:
+    S = None
+elif '-c' not in sys.argv:
     fp = sys.argv[-1]
     if fp[0] == '-':
         print('Missing argument: filepath. Exiting')
         sys.exit(0)
     try:
-        S = open(fp).read().split()
+        with stats.stage('read_examples'):
+            if binary:
+                S = BytePrefixTree.from_file(fp, delimiter, use_mmap)
+            else:
+                S = PrefixTree.from_file(fp, tokenizer)
     except (OSError) as ex:
         print(ex)
         print('Unable to read file [{}]. Exiting.'.format(fp))
         sys.exit(1)
+elif binary:
+    S = BytePrefixTree( os.fsencode(s) for s in sys.argv[1:] if s[:1] != '-' )
+elif tokenizer:
+    S = PrefixTree( tokenizer.tokenize(s) for s in sys.argv[1:] if s[:1] != '-' )
 else:
-    S = [s for s in sys.argv[1:] if s[0] != '-']
+    S = PrefixTree( s for s in sys.argv[1:] if s[:1] != '-' )
 
-# Stage 1, contruct prefix tree and 0-reversible automaton
+# Keys of the cached results, the expression key is derived from the
+# automaton key so a different extraction option reuses the automaton
+cache = None
+if cache_dir and not load_fp:
+    from cache import Cache, examples_key, stage_key
+    try:
+        cache = Cache(cache_dir, cache_size)
+    except OSError as ex:
+        print(ex)
+        print('Unable to use cache directory [{}]. Exiting.'.format(cache_dir))
+        sys.exit(1)
+    # The key of the examples is the same with and without tokens
+    tokens = {}
+    if tokenizer:
+        tokens['tokenize'] = tokenize
+        tokens['token_pattern'] = token_pattern if tokenize == 'regex' else None
+        tokens['token_delimiter'] = token_delimiter if tokenize == 'delimiter' else None
+    learn_key = stage_key(examples_key(S), engine=engine, minimize=minimize, **tokens)
+    # Decomposition changes the order of elimination (but the number of
+    # workers doesn't change the result)
+    components = {'components': True} if workers else {}
+    emitted = {'emit': dialect, 'anchor': anchor} if dialect else {}
+    if dialect and binary:
+        emitted['binary'] = True
+    extract_key = stage_key(learn_key, order=order, simplify=simplify, **components, **emitted)
+    text = cache.get_expression(extract_key)
+    if text is not None and not save_fp and not benchmark_match and not (max_length and len(text) > max_length):
+        if verbose:
+            print('Found expression in cache.')
+            print('Final Expression: ', end='')
+        print_expression(text)
+        if '-l' in sys.argv:
+            print('Length: {}'.format(len(text)), file=sys.stderr)
+        print_stats()
+        sys.exit(0)
 
-L = A0Learner(S)
-if verbose:
-    print('Constructing 0-reversible automaton from examples.')
-L.learn(verbose)
-A = L.get_automaton()
+# Stage 1, contruct prefix tree and 0-reversible automaton (or load it)
+
+A = cache.get_automaton(learn_key) if cache else None
+cached = A is not None
+if cached:
+    if verbose:
+        print('Found automaton in cache.')
+elif load_fp:
+    try:
+        A = Automaton.load(load_fp)
+    except (OSError, ValueError) as ex:
+        print(ex)
+        print('Unable to load automaton [{}]. Exiting.'.format(load_fp))
+        sys.exit(1)
+    if verbose:
+        A.show(title='Loaded Automaton')
+else:
+    L = ENGINES[engine](S, stats=stats)
+    if verbose:
+        print('Constructing 0-reversible automaton from examples.')
+    L.learn(verbose)
+    A = L.get_automaton()
+
+# Optional stage, merge equivalent states
+if minimize != 'no' and not cached:
+    M = Minimizer(A, minimize, stats)
+    try:
+        M.minimize(verbose)
+    except ValueError as ex:
+        print(ex)
+        sys.exit(1)
+    print('States: {} -> {}'.format(M.states_before, M.states_after), file=sys.stderr)
+    if verbose:
+        A.show(title='Minimized Automaton')
+
+if cache and not cached:
+    try:
+        cache.put_automaton(learn_key, A)
+    except OSError as ex:
+        print('Unable to write to cache: {}'.format(ex), file=sys.stderr)
 
-# Stage 2, parse regular expressoin from automaton
-P = REParser(A)
+if save_fp:
+    try:
+        A.save(save_fp)
+    except OSError as ex:
+        print(ex)
+        print('Unable to save automaton [{}]. Exiting.'.format(save_fp))
+        sys.exit(1)
+
+# Stage 3, parse regular expressoin from automaton
+P = REParser(A, order, simplify, stats, workers, time_budget, max_label_length, max_length, fallback,
+    tokenizer.expressions if tokenizer else None)
 if verbose:
     print('Extracting regular expression from automaton.')
-e = P.parse(verbose)
+with stats.stage('parse'):
+    e = P.parse(verbose)
+if dialect:
+    text = emit(e, dialect, anchor, binary)
+else:
+    text = str(e) if e else ''
 if verbose:
     print('Final Expression: ', end='')
-print('|'.join(e))
\ No newline at end of file
+print_expression(text)
+if P.exceeded:
+    print('Budget exceeded: {}, fallback: {}'.format(P.exceeded, fallback), file=sys.stderr)
+elif cache:
+    # Results of exceeded budgets are not cached, they depend on the budget
+    try:
+        cache.put_expression(extract_key, text)
+    except OSError as ex:
+        print('Unable to write to cache: {}'.format(ex), file=sys.stderr)
+if '-l' in sys.argv:
+    print('Length: {}'.format(len(text)), file=sys.stderr)
+if benchmark_match:
+    from benchmarks.matching import match_benchmark, to_text
+    with stats.stage('match_benchmark'):
+        print(to_text(match_benchmark(e, A, list(S.strings()))), file=sys.stderr)
+print_stats()
@@ -1,8 +1,4 @@
-import sys
-import time
-from graphviz import Digraph
-from PyQt5 import QtGui, QtWidgets
-
+import weakref
 
 class Automaton:
     """
@@ -11,218 +7,506 @@ class Automaton:
         - edges: transitions between nodes or a self-loop edge.
         - each edge has a label from some finite alphabet
 
-    Edges are represented by a matrix (list of lists), where each label is a list
-    itself (each element is an transition rule).
-
-    We rely on graphviz and Qt to draw an image of the FSA.
+    Labels are interned to small integers (symbols): self.alphabet[a] is the
+    label of symbol a and self.symbols maps labels to symbols. Edges are
+    stored sparsely: each node has a map of outgoing and a map of incoming
+    edges, keyed by the other node, and the labels of all edges between two
+    nodes are one bitmask of symbols. So bit a of self.out[i][j] (and of
+    self.inc[j][i]) is set if node i has an edge labeled alphabet[a] to node
+    j. Membership and merging label sets are bit operations, and memory
+    grows with the number of connected pairs of nodes rather than with the
+    square of the number of nodes. Labels are only converted back to
+    strings by successors(), predecessors() and get_edge().
+
+    Nodes are not stored as objects: their attributes are kept in arrays
+    indexed by the node index (see Node). self.live and self.final are
+    bytearrays with a flag per index, self.root_index is the index of the
+    initial node and labels of nodes are only stored if they are set. So
+    deleting a node and checking whether it exists are O(1), and a node
+    costs a few bytes besides its edges. Node objects are views that are
+    created when they are requested, a node has at most one view (as long
+    as it is referenced), and the view of a deleted node is detached from
+    the automaton.
+
+    We rely on graphviz and Qt to draw an image of the FSA (see visualize.py),
+    but these are optional and only imported when drawing.
 
     """
     def __init__(self):
-        self.nodes = []
-        self.node_index = 0
-        self.root = None
-        self.accepting_nodes = []
-        self.deleted_indices = set()
-        self.esize = 100
-        self.edges = [ [ [] for i in range(self.esize)] for j in range(self.esize)]
-        self.graph_fp = 'graphs/dfs_' + str(round(time.time()))
-        self.graph = Digraph('finite_state_machine', format='png', filename=self.graph_fp)
-        self.graph.attr(rankdir='LR', size='10')        
+        self.live = bytearray()
+        self.final = bytearray()
+        self.node_labels = {}
+        self.root_index = None
+        self.size = 0
+        self.free_indices = []
+        self.views = weakref.WeakValueDictionary()
+        self.alphabet = []
+        self.symbols = {}
+        self.out = {}
+        self.inc = {}
 
 
     def __str__(self):
         return ' Root: [{}]\n Nodes [{}]: ({})\n Final [{}]: [{}]\n Edges [{}]: [{}]'.format(
-            self.root.label if self.root else 'None',
+            self.root_index if self.root_index is not None else 'None',
             len(self.nodes),
-            ', '.join(n.label for n in self.nodes),
-            len(self.final_states),
-            ', '.join(n.label for n in self.final_states),
-            len(self.edges),
-            ', '.join('({}=>{}, "{}")'.format(e.source.name, e.target.name, e.label) for e in self.edges)
+            ', '.join(str(n.index) for n in self.nodes),
+            len(self.accepting_nodes),
+            ', '.join(str(n.index) for n in self.accepting_nodes),
+            self.edge_count(),
+            ', '.join('({}=>{}, "{}")'.format(i, j, label) \
+                for i in self.out for j, mask in self.out[i].items() for label in self.labels(mask))
                 )
 
 
+    def __getstate__(self):
+        """
+        Views are not pickled (e.g. when an automaton is sent to a worker
+        process), the unpickled automaton creates new ones.
+        """
+        state = self.__dict__.copy()
+        del state['views']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.views = weakref.WeakValueDictionary()
+
+
+    @property
+    def nodes(self):
+        """
+        Live nodes, in order of their index.
+        """
+        return Nodes(self)
+
+
+    @property
+    def accepting_nodes(self):
+        """
+        List of the live accepting nodes, in order of their index.
+        """
+        return [self.get_node(i) for i in flagged(self.final)]
+
+
+    @property
+    def root(self):
+        return None if self.root_index is None else self.get_node(self.root_index)
+
+
+    @root.setter
+    def root(self, node):
+        self.root_index = None if node is None else node.index
+
+
+    @property
+    def node_index(self):
+        """
+        Number of indices in use (including those of deleted nodes).
+        """
+        return len(self.live)
+
+
+    def symbol(self, label):
+        """
+        Returns the symbol of label, a new symbol is added for a new label.
+        """
+        a = self.symbols.get(label)
+        if a is None:
+            a = self.symbols[label] = len(self.alphabet)
+            self.alphabet.append(label)
+        return a
+
+
+    def add_symbols(self, labels):
+        """
+        Returns list with the symbol of each label.
+        """
+        return [self.symbol(label) for label in labels]
+
+
+    def labels(self, mask):
+        """
+        Returns list of the labels of the symbols in mask.
+        """
+        return [self.alphabet[a] for a in bits(mask)]
+
+
     def add_node(self, is_initial=False, is_final=False, label=''):
         """
-        Creates a node object and make sure that the matrix self.edges is larger
-        than the number of nodes.
+        Creates a node with empty maps of incoming and outgoing edges.
+        Indices of deleted nodes are reused.
         """
-        if len(self.nodes) > self.esize:
-            self.expand_edges()
+        return self.get_node( self.add_node_index(is_initial, is_final, label) )
 
-        node = Node( self.node_index, label, is_initial, is_final)
-        self.node_index += 1
-        self.nodes.append( node )
 
-        if not self.root or is_initial:
-            self.root = node
-        if is_final:
-            self.accepting_nodes.append( node )
-        return node
+    def add_node_index(self, is_initial=False, is_final=False, label=''):
+        """
+        Same as add_node(), but returns the index of the new node (without
+        creating a view).
+        """
+        if self.free_indices:
+            index = self.free_indices.pop()
+        else:
+            index = len(self.live)
+            self.live.append(0)
+            self.final.append(0)
+        self.live[index] = 1
+        self.final[index] = 1 if is_final else 0
+        if label:
+            self.node_labels[index] = label
+        self.out[index] = {}
+        self.inc[index] = {}
+        self.size += 1
+
+        if self.root_index is None or is_initial:
+            self.root_index = index
+        return index
+
+
+    def has_node(self, node):
+        """
+        Check if node is still part of the automaton (i.e. was not deleted
+        or merged into another node).
+        """
+        return node.automaton is self
 
 
     def delete_node(self, node):
         """
-        Remove node from lists and keep track of its index
-        (this is necessary to ignore edges of deletd nodes later).
+        Remove node and all its edges from the automaton, its index will
+        be reused for new nodes.
+        """
+        i = node.index
+        for j in self.out.pop(i):
+            if j != i:
+                del self.inc[j][i]
+        for j in self.inc.pop(i):
+            if j != i:
+                del self.out[j][i]
+        if self.root_index == i:
+            self.root_index = None
+        self.release(i)
+
+
+    def release(self, i):
+        """
+        Clear the attributes of the deleted node i and detach its view.
         """
-        self.deleted_indices.add( node.index )
-        self.nodes.remove(node)
-        if node in self.accepting_nodes:
-            self.accepting_nodes.remove(node)
+        self.live[i] = 0
+        self.final[i] = 0
+        self.node_labels.pop(i, None)
+        view = self.views.pop(i, None)
+        if view is not None:
+            view.automaton = None
+        self.free_indices.append(i)
+        self.size -= 1
 
 
     def merge_nodes(self, nodes, new_label=''):
         """
-        Merges a list of nodes into a new node.
-        All edges to and from the merged nodes are reassigned to the new node.
+        Merges a list of nodes into one of them, the node with most edges
+        survives (so we have to reassign as few edges as possible). All edges
+        to and from the other nodes are reassigned to the surviving node, so
+        the cost is proportional to the degree of the merged nodes.
 
         :args:
             nodes       - list of Node objects
-            new_label   - string, label of the new node
+            new_label   - string, new label of the surviving node
+        :returns:
+            node        - surviving Node object
+        """
+
+        if not nodes:
+            return None
+        return self.get_node( self.merge([n.index for n in nodes], new_label) )
+
+
+    def merge(self, indices, new_label=''):
+        """
+        Same as merge_nodes(), but with indices of nodes.
+
         :returns:
-            new_node    - Node object
-        """
-
-        # Keep track track of the indices of the nodes to be merged, so we 
-        # don't try to merge the new node as well (e.g. when it's accepting node)
-        merge_indices = [n.index for n in nodes]
-        #print(f'preparing to merge nodes: {merge_indices}') 
-
-        # Create new Node object
-        # If any of the old nodes is initial or accepting, inherit this property
-        new_node = self.add_node(
-                        is_initial=True if any([n.is_initial for n in nodes]) else False, 
-                        is_final=True if any([n.is_final for n in nodes]) else False,
-                        label=new_label
-                        )
-        new_i = new_node.index
-        #print(f'created new node with index {new_i}')
-        # Merge edges from nodes and delete
-        for n1 in list(self.nodes):
-            for n2 in list(self.nodes):
-                if self.edges[n1.index][n2.index] and (n1.index in merge_indices or n2.index in merge_indices):
-                    # Edge is selfloop or edge is between nodes to be merged
-                    if n1.index == n2.index or (n1.index in merge_indices and n2.index in merge_indices):
-                        #print('<=>', self.edges[n1.index][n2.index])
-                        self.add_edges(new_node, new_node, self.edges[n1.index][n2.index])
-                    # Edge is *from* nodes to be merged
-                    elif n1.index in merge_indices:
-                        #print('<=', self.edges[n1.index][n2.index])
-                        self.add_edges(new_node, n2, self.edges[n1.index][n2.index])
-                    # Edge is *to* nodes to be merged
-                    elif n2.index in merge_indices:
-                        #print('=>', self.edges[n1.index][n2.index])
-                        self.add_edges(n1, new_node, self.edges[n1.index][n2.index])
-                    # Delete old edge
-                    self.edges[n1.index][n2.index] = []
-
-        # Delete merged nodes
-        for node in list(nodes):
-            self.delete_node(node)
-        # Update initial and final states
-        if new_node.is_initial:
-            self.root = new_node
-        if new_node.is_final:
-            self.accepting_nodes = [new_node]
-
-        return new_node
+            i           - index of the surviving node
+        """
+        out = self.out
+        inc = self.inc
+        i = max(indices, key=lambda j: len(out[j]) + len(inc[j]))
+        merge_indices = set(indices)
+        merge_indices.remove(i)
+        if new_label:
+            self.node_labels[i] = new_label
+
+        for j in merge_indices:
+            # Edges of j to and from other merged nodes (or itself) become
+            # self-loops of the surviving node. The merged nodes that are
+            # not handled yet still have edges from and to j, remove those.
+            for t, mask in out.pop(j).items():
+                if t != j and t in inc:
+                    del inc[t][j]
+                self.add_edge_mask(i, i if t == i or t == j or t in merge_indices else t, mask)
+            for s, mask in inc.pop(j).items():
+                if s == j:
+                    continue
+                if s in out:
+                    del out[s][j]
+                self.add_edge_mask(i if s == i or s in merge_indices else s, i, mask)
+            # If any of the merged nodes is initial or accepting, the
+            # surviving node inherits this property
+            if self.root_index == j:
+                self.root_index = i
+            if self.final[j]:
+                self.final[i] = 1
+            self.release(j)
+
+        return i
+
+
+    def compact(self):
+        """
+        Renumber the live nodes, so their indices are 0 ... n-1 (in order of
+        their index). Since merged nodes are deleted, after learning the
+        indices usually have large gaps.
+        """
+        old = flagged(self.live)
+        index = {j: i for i, j in enumerate(old)}
+        self.out = {index[i]: {index[j]: mask for j, mask in edges.items()} for i, edges in self.out.items()}
+        self.inc = {index[i]: {index[j]: mask for j, mask in edges.items()} for i, edges in self.inc.items()}
+        self.live = bytearray(b'\x01') * len(old)
+        self.final = bytearray(self.final[j] for j in old)
+        self.node_labels = {index[j]: label for j, label in self.node_labels.items()}
+        if self.root_index is not None:
+            self.root_index = index[self.root_index]
+        views = list(self.views.items())
+        self.views = weakref.WeakValueDictionary()
+        for j, view in views:
+            view.index = index[j]
+            self.views[view.index] = view
+        self.free_indices = []
+
+
+    def get_node(self, i):
+        """
+        Returns the view of live node i.
+        """
+        node = self.views.get(i)
+        if node is None:
+            if not (0 <= i < len(self.live) and self.live[i]):
+                raise KeyError(i)
+            node = self.views[i] = Node(self, i)
+        return node
+
+
+    def degree(self, node):
+        """
+        Number of nodes connected to node (in either direction).
+        """
+        return len(self.out[node.index]) + len(self.inc[node.index])
 
 
     def add_edge(self, n1, n2, label):
-        self.edges[n1.index][n2.index].append(label)
+        self.add_edge_mask(n1.index, n2.index, 1 << self.symbol(label))
+
+
+    def add_edge_mask(self, i, j, mask):
+        """
+        Add edges from node i to node j, with the symbols in mask.
+        """
+        mask |= self.out[i].get(j, 0)
+        self.out[i][j] = self.inc[j][i] = mask
 
 
     def add_edges(self, n1, n2, labels):
-        if not self.edges[n1.index][n2.index]:
-            self.edges[n1.index][n2.index] = labels
-        else:
-            for label in labels:
-                if label not in self.edges[n1.index][n2.index]:
-                    self.edges[n1.index][n2.index].append(label)
+        mask = 0
+        for a in self.add_symbols(labels):
+            mask |= 1 << a
+        self.add_edge_mask(n1.index, n2.index, mask)
 
 
     def get_edge(self, n1, n2):
-        edge = self.edges[n1.index][n2.index]
-        return edge if edge != [''] else None
+        """
+        Returns list of labels of the edges from n1 to n2 (empty if none).
+        """
+        return self.labels( self.out[n1.index].get(n2.index, 0) )
 
 
     def delete_edge(self, n1, n2):
-        self.edges[n1.index, n2.index] = ['']
+        if n2.index in self.out[n1.index]:
+            del self.out[n1.index][n2.index]
+            del self.inc[n2.index][n1.index]
+
+
+    def clear_edges(self):
+        for i in self.out:
+            self.out[i] = {}
+            self.inc[i] = {}
+
+
+    def successors(self, node):
+        """
+        Returns dict with indices of target nodes as keys and lists of
+        labels as values.
+        """
+        return {j: self.labels(mask) for j, mask in self.out[node.index].items()}
+
+
+    def predecessors(self, node):
+        """
+        Returns dict with indices of source nodes as keys and lists of
+        labels as values.
+        """
+        return {i: self.labels(mask) for i, mask in self.inc[node.index].items()}
+
+
+    def edge_count(self):
+        return sum(bin(mask).count('1') for edges in self.out.values() for mask in edges.values())
 
 
-    def expand_edges(self):
+    def compile(self):
         """
-        Replaces the current edges matrix with one twice as large.
+        Returns a table-driven matcher for the language of the automaton
+        (see matcher.py).
         """
-        #print(f'Expanding E matrix from {self.esize} to {self.esize*2}')
-        self.esize *= 2
-        new_edges = [[self.edges[i][j] if i <= self.node_index and j <= self.node_index else [] \
-            for i in range(self.esize)] for j in range(self.esize)]
-        self.edges = new_edges
+        from matcher import CompiledAutomaton
+        return CompiledAutomaton(self)
+
+
+    def save(self, fp):
+        """
+        Write the automaton to a binary file (see storage.py).
+        """
+        from storage import save
+        save(self, fp)
+
+
+    @classmethod
+    def load(cls, fp):
+        """
+        Read an automaton written by save().
+        """
+        from storage import AutomatonFile
+        with AutomatonFile(fp) as F:
+            return F.to_automaton(cls())
 
 
     def show(self, title='Finite State Automaton'):
         """
-        Open a QT window and draw Automaton with graphviz.
-        """
-        self.reset_graph()
-        self.graph.render()
-        App = QtWidgets.QApplication(sys.argv)
-        W = QtWidgets.QWidget()
-        L = QtWidgets.QLabel(W)
-        L.setText("Your Finite State Automaton:")
-        P = QtGui.QPixmap(self.graph_fp + '.png')
-        L.setPixmap(P)
-        W.setGeometry(0, 0, P.width()+100, P.height()+50)
-        L.move(50,20)
-        W.setWindowTitle(title)
-        W.show()
-        App.exec_()        
-
-
-    def reset_graph(self):
-        """
-        Reconstruct a new graphviz graph
-        """
-        self.graph.clear()
-        # Add all nodes
-        for node in self.nodes:
-            if node == self.root or node.is_initial:
-                self.graph.attr('node', 
-                                width='0.8', 
-                                height='0.8', 
-                                shape='circle', 
-                                style='filled', 
-                                fillcolor='yellow' )
-            if node.is_final:
-                self.graph.attr( 'node', 
-                                shape='doublecircle', 
-                                style='filled', 
-                                fillcolor='lightskyblue' )
-            else:
-                self.graph.attr( 'node', 
-                                shape='circle', 
-                                style='filled', 
-                                fillcolor='azure2' )
-            label = '<q<SUB><FONT POINT-SIZE="10">' + str(node.index) + '</FONT></SUB>>'
-            self.graph.node( str(node.index), label=label )
-        # Add edges
-        for i in range(self.node_index+1):
-            if i not in self.deleted_indices:
-                for j in range(self.node_index+1):
-                    if self.edges[i][j] and j not in self.deleted_indices:
-                        self.graph.edge(str(i), str(j), label=''.join(self.edges[i][j]))
+        Open a QT window and draw Automaton with graphviz. Both packages are
+        only imported here, so they are not required unless we draw graphs.
+        """
+        from visualize import show
+        show(self, title)
 
 
 
 class Node:
-    def __init__(self, index,  label='', is_initial=False, is_final=False):
+    """
+    View of a node of an Automaton, its attributes are read from and written
+    to the arrays of the automaton. The view of a deleted (or merged) node is
+    detached, its automaton is None.
+    """
+
+    __slots__ = ('automaton', 'index', '__weakref__')
+
+    def __init__(self, automaton, index):
+        self.automaton = automaton
         self.index = index
-        self.label = label
-        self.is_initial = is_initial
-        self.is_final = is_final
+
+
+    @property
+    def is_initial(self):
+        return self.automaton.root_index == self.index
+
+
+    @is_initial.setter
+    def is_initial(self, value):
+        if value:
+            self.automaton.root_index = self.index
+        elif self.automaton.root_index == self.index:
+            self.automaton.root_index = None
+
+
+    @property
+    def is_final(self):
+        return bool(self.automaton.final[self.index])
+
+
+    @is_final.setter
+    def is_final(self, value):
+        self.automaton.final[self.index] = 1 if value else 0
+
+
+    @property
+    def label(self):
+        return self.automaton.node_labels.get(self.index, '')
+
+
+    @label.setter
+    def label(self, value):
+        if value:
+            self.automaton.node_labels[self.index] = value
+        else:
+            self.automaton.node_labels.pop(self.index, None)
+
 
     def __str__(self):
         return f'NODE: ("{self.index}"), Initial: {self.is_initial} Final: {self.is_final}'
 
+
+class Nodes:
+    """
+    The live nodes of an automaton, a view like dict.values(): it has a
+    length and iterates over the nodes in order of their index.
+    """
+
+    __slots__ = ('automaton',)
+
+    def __init__(self, automaton):
+        self.automaton = automaton
+
+
+    def __len__(self):
+        return self.automaton.size
+
+
+    def __iter__(self):
+        A = self.automaton
+        for i in flagged(A.live):
+            yield A.get_node(i)
+
+
+def flagged(flags):
+    """
+    Returns list of the indices of the nonzero bytes of a bytearray.
+    """
+    indices = []
+    i = flags.find(1)
+    while i >= 0:
+        indices.append(i)
+        i = flags.find(1, i + 1)
+    return indices
+
+
+def bits(mask):
+    """
+    Returns list of the symbols in mask (positions of the set bits), in
+    increasing order.
+    """
+    symbols = []
+    while mask:
+        low = mask & -mask
+        symbols.append(low.bit_length() - 1)
+        mask ^= low
+    return symbols
+
+
+def duplicates(masks):
+    """
+    Returns mask of the symbols that are in more than one of masks.
+    """
+    seen = dup = 0
+    for mask in masks:
+        dup |= seen & mask
+        seen |= mask
+    return dup
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from zr_learner import ENGINES
+from prefix_tree import PrefixTree
+from re_parser import REParser, FALLBACKS
+from elimination_order import ORDERS
+from minimizer import Minimizer
+from stats import Stats, NULL_STATS
+from options import get_option, MINIMIZE
+
+USAGE = """
+
+    Batch mode of A0LREe - learns a regular expression for each of many sets
+    of examples, in a pool of worker processes.
+
+    Usage:
+        ./batch.py [options] <manifest.jsonl | directory>
+
+    Input, one of:
+        manifest.jsonl  one set of examples per line, as a JSON object with
+                        an "id" and either "examples" (list of strings) or
+                        "path" (file with one example per line)
+        directory       every file in the directory is a set of examples,
+                        the file name is the id
+
+    Output, one JSON object per line in order of completion, with the id,
+    "status" (ok, error or timeout), "expression", "length" and "time".
+
+    Arguments:
+        -h              print this message
+        --workers=N     number of worker processes (default: number of CPUs)
+        --chunksize=N   number of sets sent to a worker at once (default 1)
+        --timeout=SEC   time limit for each set of examples (default none)
+        --stats=json    add time and counters of each stage to the results
+        --engine, --minimize, --order, --simplify, --time-budget,
+        --max-label-length, --max-length, --fallback
+                        same as for a0lree.py, if a budget is exceeded the
+                        result has the name of the budget in "exceeded"
+    """
+
+
+class Timeout(Exception):
+    pass
+
+
+def raise_timeout(signum, frame):
+    raise Timeout()
+
+
+def read_jobs(fp):
+    """
+    Generator of jobs (dicts with id and examples or path) from a manifest
+    or a directory. Lines of the manifest that can't be parsed become jobs
+    with an error.
+    """
+    if os.path.isdir(fp):
+        for name in sorted(os.listdir(fp)):
+            path = os.path.join(fp, name)
+            if os.path.isfile(path):
+                yield {'id': name, 'path': path}
+        return
+    directory = os.path.dirname(fp)
+    with open(fp) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict) or ('examples' not in job and 'path' not in job):
+                    raise ValueError('expected an object with "examples" or "path"')
+            except ValueError as ex:
+                yield {'id': number, 'error': f'Invalid manifest line: {ex}'}
+                continue
+            job.setdefault('id', number)
+            if 'path' in job:
+                # Paths are relative to the manifest
+                job['path'] = os.path.join(directory, job['path'])
+            yield job
+
+
+def run_job(job, options, timeout=None):
+    """
+    Learn automaton and extract expression for one set of examples. All
+    exceptions are caught, so a failing set doesn't affect the others.
+
+    :args:
+        job         - dict with id and examples or path
+        options     - dict with engine, minimize, order, simplify and stats,
+                      and optionally the budgets and fallback of REParser
+        timeout     - (optional) time limit in seconds
+    :returns:
+        result      - dict with id, status and expression or error
+    """
+    result = {'id': job['id']}
+    stats = Stats() if options.get('stats') else NULL_STATS
+    start = time.perf_counter()
+    use_alarm = timeout and hasattr(signal, 'setitimer')
+    try:
+        if 'error' in job:
+            raise ValueError(job['error'])
+        if use_alarm:
+            signal.signal(signal.SIGALRM, raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            with stats.stage('read_examples'):
+                if 'path' in job:
+                    T = PrefixTree.from_file(job['path'])
+                else:
+                    T = PrefixTree(job['examples'])
+            L = ENGINES[options['engine']](T, stats=stats)
+            L.learn(False)
+            A = L.get_automaton()
+            if options['minimize'] != 'no':
+                Minimizer(A, options['minimize'], stats).minimize()
+            with stats.stage('parse'):
+                P = REParser(A, options['order'], options['simplify'], stats, 0, options.get('time_budget'),
+                    options.get('max_label_length'), options.get('max_length'), options.get('fallback', 'paths'))
+                e = P.parse(False)
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        result['status'] = 'ok'
+        result['expression'] = str(e) if e else ''
+        result['length'] = e.length if e else 0
+        if P.exceeded:
+            result['exceeded'] = P.exceeded
+    except Timeout:
+        result['status'] = 'timeout'
+    except Exception as ex:
+        result['status'] = 'error'
+        result['error'] = f'{type(ex).__name__}: {ex}'
+    result['time'] = round(time.perf_counter() - start, 6)
+    if stats.enabled:
+        result['stats'] = stats.report()
+    return result
+
+
+def run_chunk(jobs, options, timeout=None):
+    return [run_job(job, options, timeout) for job in jobs]
+
+
+def run_batch(jobs, options, workers=None, chunksize=1, timeout=None):
+    """
+    Run jobs in a process pool, generator of results in order of
+    completion. If a worker process dies, the pool breaks and all of its
+    unfinished chunks with it, so each of these is run again alone in a
+    new pool: only a chunk that breaks its own pool is reported as an
+    error.
+
+    :args:
+        jobs        - iterable of jobs (see read_jobs())
+        options     - dict with engine, minimize, order and simplify
+        workers     - (optional) number of processes
+        chunksize   - (optional) number of jobs per task
+        timeout     - (optional) time limit in seconds per job
+    """
+    jobs = list(jobs)
+    chunks = [jobs[i:i+chunksize] for i in range(0, len(jobs), chunksize)]
+    suspects = []
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(run_chunk, chunk, options, timeout): c for c, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except BrokenProcessPool:
+                suspects.append(futures[future])
+                continue
+            yield from results
+    for c in sorted(suspects):
+        with ProcessPoolExecutor(1) as pool:
+            try:
+                results = pool.submit(run_chunk, chunks[c], options, timeout).result()
+            except BrokenProcessPool:
+                results = [{'id': job['id'], 'status': 'error', 'error': 'Worker process died'} \
+                    for job in chunks[c]]
+        yield from results
+
+
+def main(argv):
+    if len(argv) < 2 or '-h' in argv or '--help' in argv:
+        print(USAGE)
+        sys.exit(0)
+
+    options = {
+        'engine': get_option(argv, '--engine', 'fast', ENGINES),
+        'minimize': get_option(argv, '--minimize', 'no', MINIMIZE),
+        'order': get_option(argv, '--order', 'list', ORDERS),
+        'simplify': get_option(argv, '--simplify', 'yes', ('yes', 'no')) == 'yes',
+        'stats': get_option(argv, '--stats', 'no', ('no', 'json')) == 'json',
+        'fallback': get_option(argv, '--fallback', 'paths', FALLBACKS),
+        }
+    try:
+        workers = get_option(argv, '--workers')
+        workers = int(workers) if workers else None
+        chunksize = int(get_option(argv, '--chunksize', '1'))
+        timeout = get_option(argv, '--timeout')
+        timeout = float(timeout) if timeout else None
+        time_budget = get_option(argv, '--time-budget')
+        options['time_budget'] = float(time_budget) if time_budget else None
+        options['max_label_length'] = int(get_option(argv, '--max-label-length', '0')) or None
+        options['max_length'] = int(get_option(argv, '--max-length', '0')) or None
+    except ValueError as ex:
+        print(ex)
+        print('Invalid value for --workers, --chunksize, --timeout or a budget. Exiting.')
+        sys.exit(1)
+
+    fp = argv[-1]
+    if fp[0] == '-':
+        print('Missing argument: manifest or directory. Exiting')
+        sys.exit(0)
+    try:
+        jobs = list(read_jobs(fp))
+    except OSError as ex:
+        print(ex)
+        print('Unable to read [{}]. Exiting.'.format(fp))
+        sys.exit(1)
+
+    for result in run_batch(jobs, options, workers, max(chunksize, 1), timeout):
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,8 @@
+"""
+Benchmarks of the pipeline on synthetic sets of examples, run from the
+root of the repository with:
+
+    python -m benchmarks [options]
+
+(see harness.py).
+"""
@@ -0,0 +1,89 @@
+"""
+Generators of synthetic sets of examples. Each generator takes the number
+of examples and a seed, and returns a list of strings. The same arguments
+always give the same list, so results of different runs (and releases) can
+be compared.
+"""
+
+import random
+
+
+def regular_language(n, seed=0):
+    """
+    Random strings of the regular language (a|bc)*d(ef|g)+, the learned
+    expression should converge to it.
+    """
+    rnd = random.Random(seed)
+    examples = []
+    for _ in range(n):
+        s = ''.join( rnd.choice(('a', 'bc')) for _ in range(rnd.randint(0, 8)) )
+        s += 'd' + ''.join( rnd.choice(('ef', 'g')) for _ in range(rnd.randint(1, 6)) )
+        examples.append(s)
+    return examples
+
+
+PACKAGES = [
+    ['com', 'org', 'net', 'io'],
+    ['example', 'acme', 'initech', 'globex', 'umbrella', 'hooli'],
+    ['core', 'util', 'net', 'db', 'ui', 'auth', 'cache', 'search'],
+    ['impl', 'api', 'internal', 'model', 'service', 'test'],
+    ]
+
+NAMES = ['Handler', 'Factory', 'Manager', 'Request', 'Response', 'Client', 'Server',
+    'Parser', 'Builder', 'Config', 'Session', 'Token', 'Cursor', 'Index', 'Query']
+
+
+def identifiers(n, seed=0):
+    """
+    Qualified class names (com.acme.db.impl.QueryBuilder2), with long
+    shared prefixes.
+    """
+    rnd = random.Random(seed)
+    examples = []
+    for _ in range(n):
+        parts = [rnd.choice(level) for level in PACKAGES[:rnd.randint(2, len(PACKAGES))]]
+        name = ''.join( rnd.choice(NAMES) for _ in range(rnd.randint(1, 2)) )
+        if rnd.random() < 0.5:
+            name += str(rnd.randint(0, 99))
+        examples.append( '.'.join(parts) + '.' + name )
+    return examples
+
+
+def log_tokens(n, seed=0):
+    """
+    Tokens as found in log files: request ids (ID-1234-ok), error codes
+    (E0042), timestamps (2021-03-04T05:06:07) and hex addresses (0x7f3a).
+    """
+    rnd = random.Random(seed)
+    examples = []
+    for _ in range(n):
+        kind = rnd.randrange(4)
+        if kind == 0:
+            s = 'ID-{}-{}'.format(rnd.randint(0, 99999), rnd.choice(('ok', 'warn', 'err')))
+        elif kind == 1:
+            s = 'E{:04d}'.format(rnd.randint(0, 9999))
+        elif kind == 2:
+            s = '20{:02d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}'.format(rnd.randint(0, 29),
+                rnd.randint(1, 12), rnd.randint(1, 28), rnd.randint(0, 23), rnd.randint(0, 59), rnd.randint(0, 59))
+        else:
+            s = '0x{:x}'.format(rnd.getrandbits(rnd.choice((16, 32, 48))))
+        examples.append(s)
+    return examples
+
+
+def large_alphabet(n, seed=0, size=1000):
+    """
+    Random strings (length 1 to 4) over an alphabet of size characters
+    (CJK ideographs).
+    """
+    rnd = random.Random(seed)
+    alphabet = [chr(0x4E00 + i) for i in range(size)]
+    return [ ''.join( rnd.choice(alphabet) for _ in range(rnd.randint(1, 4)) ) for _ in range(n) ]
+
+
+GENERATORS = {
+    'regular': regular_language,
+    'identifiers': identifiers,
+    'logs': log_tokens,
+    'alphabet': large_alphabet,
+    }
@@ -0,0 +1,191 @@
+"""
+Runs the pipeline on the synthetic sets of examples of generators.py for
+a range of sizes, and writes the time of each stage, the size of the
+prefix tree and automaton, and the peak memory to a JSON file. A previous
+result file can be given as baseline, cases that got slower are reported.
+"""
+
+import json
+import platform
+import sys
+import time
+from benchmarks.generators import GENERATORS
+from zr_learner import ENGINES
+from prefix_tree import PrefixTree
+from re_parser import REParser
+from elimination_order import ORDERS
+from stats import Stats
+from options import get_option
+
+USAGE = """
+
+    Benchmarks of A0LREe, run from the root of the repository:
+
+        python -m benchmarks [options]
+
+    Arguments:
+        -h                  print this message
+        --generators=NAMES  comma separated names of generators, default all
+                            ({})
+        --sizes=N,...       numbers of examples (default 1000,10000)
+        --engines=NAMES     learning engines (default fast)
+        --orders=NAMES      elimination orders (default dynamic)
+        --repeat=N          run each case N times, the fastest run is kept
+                            (default 3)
+        --seed=N            seed of the generators (default 0)
+        --memory=no         don't measure peak memory (an extra run with
+                            tracemalloc for each case)
+        --output=PATH       write results to file (default stdout)
+        --baseline=PATH     compare with the results in file
+        --threshold=X       report cases that are slower than the baseline
+                            by more than factor X (default 1.25)
+    """.format(', '.join(GENERATORS))
+
+
+def run_case(examples, engine, order, memory=False):
+    """
+    Run the pipeline once.
+
+    :returns:
+        stats       - instance of Stats
+        expression  - the extracted NestedRE
+    """
+    stats = Stats(memory=['total'] if memory else ())
+    with stats.stage('total'):
+        with stats.stage('read_examples'):
+            T = PrefixTree(examples)
+        L = ENGINES[engine](T, stats=stats)
+        L.learn(False)
+        with stats.stage('parse'):
+            e = REParser(L.get_automaton(), order, True, stats).parse(False)
+    return stats, e
+
+
+def benchmark(generator, size, engine, order, repeat=3, seed=0, memory=True):
+    """
+    Benchmark one case, stage times are the minimum over the runs.
+
+    :returns:
+        result      - dict
+    """
+    examples = GENERATORS[generator](size, seed)
+    stages = {}
+    for _ in range(repeat):
+        stats, e = run_case(examples, engine, order)
+        for name, S in stats.stages.items():
+            best = stages.setdefault(name, {'wall': S['wall'], 'cpu': S['cpu']})
+            best['wall'] = min(best['wall'], S['wall'])
+            best['cpu'] = min(best['cpu'], S['cpu'])
+
+    result = {
+        'generator': generator,
+        'size': size,
+        'engine': engine,
+        'order': order,
+        'seed': seed,
+        'examples': len(set(examples)),
+        'prefix_tree_states': stats.counters.get('prefix_tree_states', stats.counters.get('states_created')),
+        'states': stats.counters.get('states'),
+        'expression_length': e.length if e else 0,
+        'stages': {name: {'wall': round(S['wall'], 6), 'cpu': round(S['cpu'], 6)} for name, S in stages.items()},
+        }
+    if memory:
+        stats, e = run_case(examples, engine, order, memory=True)
+        result['memory_peak'] = stats.stages['total']['memory_peak']
+    return result
+
+
+def case_key(result):
+    return (result['generator'], result['size'], result['engine'], result['order'], result['seed'])
+
+
+def compare(results, baseline, threshold=1.25):
+    """
+    Compare total time of each case with the baseline.
+
+    :returns:
+        lines       - list of strings, one per case
+        slower      - number of cases that are slower than threshold
+    """
+    base = {case_key(r): r for r in baseline}
+    lines = []
+    slower = 0
+    for r in results:
+        b = base.get(case_key(r))
+        name = '{} size={} engine={} order={}'.format(*case_key(r)[:4])
+        if b is None:
+            lines.append(f'{name}: not in baseline')
+            continue
+        ratio = r['stages']['total']['wall'] / max(b['stages']['total']['wall'], 1e-9)
+        flag = ''
+        if ratio > threshold:
+            slower += 1
+            flag = '  SLOWER'
+        lines.append('{}: {:.4f}s -> {:.4f}s ({:.2f}x){}'.format(
+            name, b['stages']['total']['wall'], r['stages']['total']['wall'], ratio, flag))
+        for stage, S in r['stages'].items():
+            if stage in b['stages'] and stage != 'total':
+                lines.append('    {:<22} {:.4f}s -> {:.4f}s'.format(stage, b['stages'][stage]['wall'], S['wall']))
+        if 'memory_peak' in r and 'memory_peak' in b:
+            lines.append('    {:<22} {} -> {}'.format('memory_peak', b['memory_peak'], r['memory_peak']))
+    return lines, slower
+
+
+def main(argv):
+    if '-h' in argv or '--help' in argv:
+        print(USAGE)
+        sys.exit(0)
+
+    generators = get_option(argv, '--generators', ','.join(GENERATORS), GENERATORS, multiple=True).split(',')
+    engines = get_option(argv, '--engines', 'fast', ENGINES, multiple=True).split(',')
+    orders = get_option(argv, '--orders', 'dynamic', ORDERS, multiple=True).split(',')
+    memory = get_option(argv, '--memory', 'yes', ('yes', 'no')) == 'yes'
+    output = get_option(argv, '--output')
+    baseline = get_option(argv, '--baseline')
+    try:
+        sizes = [int(n) for n in get_option(argv, '--sizes', '1000,10000').split(',')]
+        repeat = max(int(get_option(argv, '--repeat', '3')), 1)
+        seed = int(get_option(argv, '--seed', '0'))
+        threshold = float(get_option(argv, '--threshold', '1.25'))
+    except ValueError as ex:
+        print(ex)
+        print('Invalid value for --sizes, --repeat, --seed or --threshold. Exiting.')
+        sys.exit(1)
+
+    results = []
+    for generator in generators:
+        for size in sizes:
+            for engine in engines:
+                for order in orders:
+                    r = benchmark(generator, size, engine, order, repeat, seed, memory)
+                    results.append(r)
+                    print('{} size={} engine={} order={}: {:.4f}s, {} states'.format(
+                        generator, size, engine, order, r['stages']['total']['wall'], r['states']),
+                        file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+        }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if baseline:
+        try:
+            with open(baseline) as f:
+                base = json.load(f)['results']
+        except (OSError, ValueError, KeyError) as ex:
+            print(ex)
+            print('Unable to read baseline [{}]. Exiting.'.format(baseline))
+            sys.exit(1)
+        lines, slower = compare(results, base, threshold)
+        print('\n'.join(lines), file=sys.stderr)
+        if slower:
+            print(f'{slower} case(s) slower than the baseline.', file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,78 @@
+"""
+Compares matching with the extracted expression (emitted for the module
+re, see emitter.py) and with the learned automaton (compiled to a table,
+see matcher.py): the time to compile each and the throughput of matching
+a list of strings, usually the examples the automaton was learned from.
+"""
+
+import re
+import time
+from emitter import emit
+
+
+def best_time(f, repeat):
+    """
+    Returns the result of f() and the fastest of repeat runs in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def match_benchmark(expression, automaton, strings, repeat=3):
+    """
+    :args:
+        expression  - NestedRE, extracted from automaton
+        automaton   - instance of Automaton
+        strings     - list of strings to match
+        repeat      - (optional) number of runs, the fastest is kept
+    :returns:
+        result      - dict with the number of strings and characters, and
+                      for re and the automaton the compile time, match
+                      time, strings per second and number of matches (or
+                      the error if the pattern can't be compiled)
+    """
+    characters = sum(len(s) for s in strings)
+    result = {'strings': len(strings), 'characters': characters}
+
+    def report(compile_time, match_time, matches):
+        return {
+            'compile_time': round(compile_time, 6),
+            'match_time': round(match_time, 6),
+            'strings_per_second': round(len(strings) / match_time) if match_time else None,
+            'matches': matches,
+            }
+
+    pattern = emit(expression, 'python') if expression else None
+    if pattern is None:
+        result['re'] = {'error': 'empty language'}
+    else:
+        try:
+            # Clear the cache of re, or it returns the pattern compiled by the previous run
+            rx, compile_time = best_time(lambda: (re.purge(), re.compile(pattern))[1], repeat)
+            matches, match_time = best_time(lambda: sum(1 for s in strings if rx.match(s)), repeat)
+            result['re'] = report(compile_time, match_time, matches)
+        except (re.error, RecursionError, OverflowError) as ex:
+            result['re'] = {'error': f'{type(ex).__name__}: {ex}'}
+
+    matcher, compile_time = best_time(automaton.compile, repeat)
+    matches, match_time = best_time(lambda: sum(matcher.accepts_many(strings)), repeat)
+    result['automaton'] = report(compile_time, match_time, matches)
+    return result
+
+
+def to_text(result):
+    lines = ['{} strings, {} characters'.format(result['strings'], result['characters'])]
+    lines.append('{:<10} {:>12} {:>12} {:>14} {:>10}'.format('matcher', 'compile [s]', 'match [s]', 'strings/s', 'matches'))
+    for name in ('re', 'automaton'):
+        R = result[name]
+        if 'error' in R:
+            lines.append('{:<10} {}'.format(name, R['error']))
+        else:
+            lines.append('{:<10} {:>12.6f} {:>12.6f} {:>14} {:>10}'.format(
+                name, R['compile_time'], R['match_time'], str(R['strings_per_second']), R['matches']))
+    return '\n'.join(lines)
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import tempfile
+from automaton import Automaton
+
+
+def examples_key(tree):
+    """
+    Hash of the set of examples in a PrefixTree. The tree has no duplicates
+    and strings() is sorted, so the order of the examples (and duplicate
+    lines) don't change the key.
+
+    :args:
+        tree        - instance of PrefixTree
+    :returns:
+        key         - hex string
+    """
+    return strings_key(tree.strings())
+
+
+def strings_key(strings):
+    """
+    Same as examples_key(), for sorted distinct strings (e.g. the examples
+    of a request, before a PrefixTree is built).
+    """
+    h = hashlib.sha256(b'examples')
+    chunk = []
+    for s in strings:
+        data = s.encode('utf-8')
+        chunk.append( len(data).to_bytes(8, 'little') )
+        chunk.append(data)
+        if len(chunk) >= 4096:
+            h.update( b''.join(chunk) )
+            chunk = []
+    h.update( b''.join(chunk) )
+    return h.hexdigest()
+
+
+def stage_key(key, **options):
+    """
+    Key of a stage of the pipeline, from the key of its input (the examples
+    or the previous stage) and the options of the stage.
+    """
+    h = hashlib.sha256(key.encode('ascii'))
+    for name, value in sorted(options.items()):
+        h.update( f'\0{name}={value}'.encode('utf-8') )
+    return h.hexdigest()
+
+
+class Cache:
+    """
+    On-disk cache of the results of the pipeline. Each entry is a file in
+    the cache directory, named by its key:
+        - <key>.automaton   learned (and minimized) automaton, in the
+                            format of storage.py
+        - <key>.re          extracted expression
+    Keys are content addresses (see examples_key() and stage_key()), so an
+    entry never has to be invalidated. The expression key is derived from
+    the automaton key, so with different extraction options the learned
+    automaton is still found.
+
+    The total size of the entries is bounded, the least recently used
+    entries are removed first (a hit updates the modification time of the
+    file). Files are written to a temporary file first and then renamed,
+    so concurrent runs only ever see complete entries.
+
+    :args:
+        directory   - path of the cache directory, created if missing
+        max_size    - (optional) maximum total size in bytes
+    """
+
+    def __init__(self, directory, max_size=256 * 2**20):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+
+    def path(self, key, kind):
+        return os.path.join(self.directory, f'{key}.{kind}')
+
+
+    def touch(self, fp):
+        """
+        Mark entry as recently used, returns False if it doesn't exist.
+        """
+        try:
+            os.utime(fp)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+    def get_automaton(self, key):
+        """
+        Returns the cached Automaton, or None on a miss.
+        """
+        fp = self.path(key, 'automaton')
+        if not self.touch(fp):
+            return None
+        try:
+            return Automaton.load(fp)
+        except (OSError, ValueError):
+            return None
+
+
+    def put_automaton(self, key, automaton):
+        self.write(key, 'automaton', lambda fp: automaton.save(fp))
+
+
+    def get_expression(self, key):
+        """
+        Returns the cached expression as a string ('' if the language is
+        empty), or None on a miss.
+        """
+        fp = self.path(key, 're')
+        if not self.touch(fp):
+            return None
+        try:
+            with open(fp, encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+    def put_expression(self, key, expression):
+        def write(fp):
+            with open(fp, 'w', encoding='utf-8') as f:
+                f.write(expression)
+        self.write(key, 're', write)
+
+
+    def write(self, key, kind, write):
+        """
+        Write an entry with the function write(fp) to a temporary file and
+        rename it, then evict old entries.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        os.chmod(tmp, 0o644)
+        try:
+            write(tmp)
+            os.replace(tmp, self.path(key, kind))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+
+    def evict(self):
+        """
+        Remove least recently used entries until the total size is at most
+        max_size.
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith( ('.automaton', '.re') ):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append( (stat.st_mtime, stat.st_size, entry.path) )
+                total += stat.st_size
+        entries.sort()
+        for mtime, size, fp in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(fp)
+            except FileNotFoundError:
+                pass
+            total -= size
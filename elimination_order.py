@@ -0,0 +1,125 @@
+import heapq
+from collections import deque
+
+class ListOrder:
+    """
+    Eliminate nodes in the order they were created, i.e. in the order of
+    the list of nodes of the automaton. This is the original order used
+    by REParser.
+
+    All orders are queues of nodes to be eliminated, and share the same
+    interface:
+        - pop()         returns the next node to be eliminated
+        - update(nodes) is called after an elimination with the neighbours
+                        of the eliminated node (which have new edges now).
+
+    :args:
+        succ        - dict, succ[i][j] is the label (NestedRE) of the edge from i to j
+        pred        - dict, pred[j][i] is the label (NestedRE) of the edge from i to j
+        nodes       - list of indices of the nodes to be eliminated
+    """
+
+    def __init__(self, succ, pred, nodes):
+        self.succ = succ
+        self.pred = pred
+        self.nodes = deque(nodes)
+
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+    def pop(self):
+        return self.nodes.popleft()
+
+
+    def update(self, nodes):
+        pass
+
+
+class StaticOrder(ListOrder):
+    """
+    Eliminate nodes with the lowest weight first, the weights are computed
+    only once, before the first elimination.
+    """
+
+    def __init__(self, succ, pred, nodes):
+        super().__init__(succ, pred, nodes)
+        # Sort in reverse order, so we can pop from the end of the list
+        self.nodes = sorted(self.nodes, key=lambda k: weight(self.succ, self.pred, k), reverse=True)
+
+
+    def pop(self):
+        return self.nodes.pop()
+
+
+class DynamicOrder(ListOrder):
+    """
+    Eliminate node with the lowest weight first. Weights are kept in a
+    priority queue and the weights of the neighbours are recomputed after
+    each elimination. Outdated entries of the queue are skipped.
+    """
+
+    def __init__(self, succ, pred, nodes):
+        super().__init__(succ, pred, nodes)
+        self.weights = {}
+        self.queue = []
+        self.position = {k: i for i, k in enumerate(self.nodes)}
+        for k in self.nodes:
+            self.push(k)
+
+
+    def __len__(self):
+        return len(self.weights)
+
+
+    def push(self, k):
+        w = weight(self.succ, self.pred, k)
+        self.weights[k] = w
+        heapq.heappush(self.queue, (w, self.position[k], k))
+
+
+    def pop(self):
+        while True:
+            w, _, k = heapq.heappop(self.queue)
+            if self.weights.get(k) == w:
+                del self.weights[k]
+                return k
+
+
+    def update(self, nodes):
+        for k in nodes:
+            if k in self.weights:
+                self.push(k)
+
+
+def weight(succ, pred, k):
+    """
+    Estimate how much the labels grow when node k is eliminated: each
+    incoming label is copied for every outgoing edge and the other way
+    around, and the label of the self-loop is copied for every pair of
+    incoming and outgoing edges.
+
+    :args:
+        succ    - dict, succ[i][j] is the label (NestedRE) of the edge from i to j
+        pred    - dict, pred[j][i] is the label (NestedRE) of the edge from i to j
+        k       - index of the node
+    :returns:
+        W       - int, weight of the node
+    """
+    P = [label for i, label in pred[k].items() if i != k]
+    S = [label for j, label in succ[k].items() if j != k]
+    loop = succ[k].get(k)
+
+    size_in = sum(label.length for label in P)
+    size_out = sum(label.length for label in S)
+    size_loop = loop.length if loop else 0
+
+    return size_in * (len(S) - 1) + size_out * (len(P) - 1) + size_loop * (len(P) * len(S) - 1)
+
+
+ORDERS = {
+    'list': ListOrder,
+    'static': StaticOrder,
+    'dynamic': DynamicOrder
+}
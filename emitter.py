@@ -0,0 +1,258 @@
+from nested_re import LITERAL, CLASS, EPSILON_OP, UNION, CONCAT, CLOSURES, EPSILON
+
+# Output dialects (option --emit)
+DIALECTS = ('python', 'pcre', 'posix')
+
+# Characters that have to be escaped outside of a character class (the
+# same in all dialects)
+SPECIAL = set('\\.^$|?*+()[]{}')
+
+# Characters that have to be escaped in a character class (python, pcre),
+# & ~ | are escaped because Python reserves doubled ones for set operations
+CLASS_SPECIAL = set('\\]^-[&~|')
+
+# Start and end of the whole pattern, by dialect
+ANCHORS = {
+    'python': ('\\A', '\\Z'),
+    'pcre': ('\\A', '\\z'),
+    'posix': ('^', '$'),
+    }
+
+# Pattern of the empty language (an expression that is None), by dialect:
+# an empty pattern would match every string. POSIX ERE has no lookahead,
+# but ^ is an anchor anywhere in the pattern, so nothing can precede it
+NOTHING = {
+    'python': '(?!)',
+    'pcre': '(?!)',
+    'posix': 'a^',
+    }
+
+
+class Emitter:
+    """
+    Write an expression as a pattern in the syntax of a regex engine. The
+    flat string of NestedRE (see NestedRE.make_flat()) is meant to be read:
+    it contains ϵ, its groups are capturing and labels are not escaped. The
+    emitted pattern:
+        - has no ϵ: an optional union gets a '?', ϵ elsewhere is removed,
+        - uses non-capturing groups (?:...), except in POSIX ERE which
+          only has capturing groups,
+        - escapes the special characters of literals and classes, and in
+          python and pcre the characters that are not printable (and with
+          binary, all characters that are not ASCII),
+        - is anchored at the start and end of the string (optional).
+
+    Like make_flat(), the expression DAG is traversed with a stack, so deep
+    expressions don't hit the recursion limit.
+
+    :args:
+        dialect     - (optional) one of DIALECTS:
+                        - python: module re,
+                        - pcre: PCRE and compatible engines,
+                        - posix: POSIX extended regular expressions.
+        anchor      - (optional) anchor the pattern, so it only matches the
+                      whole string
+        binary      - (optional) labels are bytes decoded as latin-1 (see
+                      BytePrefixTree), the pattern is meant to be encoded
+                      as latin-1 and matched against bytes
+    """
+
+    def __init__(self, dialect='python', anchor=True, binary=False):
+        if dialect not in DIALECTS:
+            raise ValueError(f'Unknown dialect [{dialect}], expected one of: {", ".join(DIALECTS)}')
+        self.dialect = dialect
+        self.anchor = anchor
+        self.binary = binary
+        self.group = '(' if dialect == 'posix' else '(?:'
+
+
+    def emit(self, expression):
+        """
+        Returns the pattern of expression (a NestedRE), an expression that
+        matches nothing (None) has a pattern that never matches.
+        """
+        if expression is None:
+            return NOTHING[self.dialect]
+
+        parts = []
+        stack = [expression]
+        if self.anchor:
+            start, end = ANCHORS[self.dialect]
+            parts.append(start)
+            stack = [end, expression]
+        elif expression.op == UNION:
+            # A union on its own needs no group
+            alts, optional = union_alternatives(expression)
+            if not optional:
+                stack = self.join_alternatives(alts)
+
+        while stack:
+            x = stack.pop()
+            if type(x) is str:
+                parts.append(x)
+            elif x.op == LITERAL:
+                parts.append( self.escape(x.args[0]) )
+            elif x.op == CLASS:
+                parts.append( self.char_class(x.args) )
+            elif x.op == EPSILON_OP:
+                pass
+            elif x.op == UNION:
+                alts, optional = union_alternatives(x)
+                stack.append( ')?' if optional else ')' )
+                stack.extend( self.join_alternatives(alts) )
+                stack.append( self.group )
+            elif x.op == CONCAT:
+                stack.extend( (x.args[1], x.args[0]) )
+            elif self.is_atomic(x.args[0]):
+                stack.extend( (CLOSURES[x.op], x.args[0]) )
+            else:
+                stack.extend( (')' + CLOSURES[x.op], x.args[0], self.group) )
+
+        return ''.join(parts)
+
+
+    def join_alternatives(self, alts):
+        """
+        Stack items of alternatives separated by '|' (in reverse order).
+        """
+        items = []
+        for x in reversed(alts):
+            if items:
+                items.append('|')
+            items.append(x)
+        return items
+
+
+    def is_atomic(self, x):
+        """
+        Check whether a closure can be appended without a group.
+        """
+        if x.op == UNION:
+            return not union_alternatives(x)[1]
+        return x.op == CLASS or (x.op == LITERAL and len(x.args[0]) == 1)
+
+
+    def escape(self, text):
+        """
+        Escape the special characters of a literal.
+        """
+        parts = []
+        for char in text:
+            if char in SPECIAL:
+                parts.append('\\' + char)
+            elif self.dialect != 'posix' and self.is_unprintable(char):
+                parts.append( self.escape_code(char) )
+            else:
+                parts.append(char)
+        return ''.join(parts)
+
+
+    def escape_code(self, char):
+        """
+        Escape sequence of a character by its code point.
+        """
+        code = ord(char)
+        if self.dialect == 'pcre':
+            return '\\x{%x}' % code
+        if code < 0x100:
+            return '\\x%02x' % code
+        if code < 0x10000:
+            return '\\u%04x' % code
+        return '\\U%08x' % code
+
+
+    def char_class(self, chars):
+        """
+        Character class of the (sorted) characters, runs of three or more
+        consecutive characters are written as ranges.
+        """
+        if self.dialect == 'posix':
+            return posix_class(chars)
+        parts = []
+        for first, last in ranges(chars):
+            first, last = self.class_char(first), self.class_char(last)
+            parts.append(first if first == last else first + '-' + last)
+        return '[' + ''.join(parts) + ']'
+
+
+    def class_char(self, char):
+        if char in CLASS_SPECIAL:
+            return '\\' + char
+        if self.is_unprintable(char):
+            return self.escape_code(char)
+        return char
+
+
+    def is_unprintable(self, char):
+        """
+        Check whether char is written as an escape sequence (python, pcre).
+        """
+        return not char.isprintable() or (self.binary and ord(char) > 0x7e)
+
+
+def union_alternatives(x):
+    """
+    Alternatives of nested unions, and whether one of them is ϵ.
+
+    :returns:
+        alts        - list of NestedRE
+        optional    - bool
+    """
+    alts = []
+    optional = False
+    stack = [x]
+    while stack:
+        y = stack.pop()
+        if y.op == UNION:
+            stack.extend( (y.args[1], y.args[0]) )
+        elif y is EPSILON:
+            optional = True
+        else:
+            alts.append(y)
+    return alts, optional
+
+
+def ranges(chars):
+    """
+    List of (first, last) runs of consecutive characters, runs of one or
+    two characters are split into single characters.
+    """
+    runs = []
+    i = 0
+    while i < len(chars):
+        j = i
+        while j + 1 < len(chars) and ord(chars[j+1]) == ord(chars[j]) + 1:
+            j += 1
+        if j - i >= 2:
+            runs.append( (chars[i], chars[j]) )
+        else:
+            runs.extend( (c, c) for c in chars[i:j+1] )
+        i = j + 1
+    return runs
+
+
+def posix_class(chars):
+    """
+    Character class in POSIX syntax, which has no escapes: ']' has to be
+    the first character, '-' the last and '^' must not be the first.
+    """
+    plain = [c for c in chars if c not in ']^-']
+    parts = [first if first == last else first + '-' + last for first, last in ranges(plain)]
+    if ']' in chars:
+        parts.insert(0, ']')
+    if '^' in chars:
+        parts.append('^')
+    if '-' in chars:
+        # '^' and '-' only: '-' first, since '^' can't be
+        if parts == ['^']:
+            parts.insert(0, '-')
+        else:
+            parts.append('-')
+    return '[' + ''.join(parts) + ']'
+
+
+def emit(expression, dialect='python', anchor=True, binary=False):
+    """
+    Returns the pattern of expression in dialect (see Emitter).
+    """
+    return Emitter(dialect, anchor, binary).emit(expression)
@@ -0,0 +1,187 @@
+from array import array
+from automaton import bits
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class CompiledAutomaton:
+    """
+    Table-driven matcher for the language of an automaton. This is an
+    alternative to compiling the (often very large) extracted expression
+    with the re module.
+
+    The automaton is converted into a DFA (with the subset construction,
+    since learned automata are not necessarily deterministic) and its
+    transitions are stored in a dense table of integers: the next state
+    of state q with symbol a is table[q * width + a]. Each symbol is mapped
+    to an integer, the last column is for symbols that are not in the
+    alphabet. State 0 is the dead state (no accepting state is reachable),
+    state 1 is the initial state.
+
+    accepts_many() uses NumPy if it is installed, otherwise it falls back
+    to accepts() for each string. It also falls back if a label is not a
+    single character (e.g. learned with a Tokenizer), then the strings are
+    sequences of labels.
+
+    :args:
+        automaton   - instance of Automaton, or an AutomatonFile (see
+                      storage.py) whose arrays are read in place
+    """
+
+    def __init__(self, automaton):
+        if hasattr(automaton, 'offsets'):
+            alphabet, root, final, transitions = file_transitions(automaton)
+        else:
+            alphabet, root, final, transitions = automaton_transitions(automaton)
+        self.alphabet = sorted(alphabet)
+        self.symbols = {a: i for i, a in enumerate(self.alphabet)}
+        self.width = len(self.alphabet) + 1
+        self.table = array('l')
+        self.final = bytearray()
+        self.characters = all(len(a) == 1 for a in self.alphabet)
+        self.determinize(root, final, transitions)
+
+
+    def __len__(self):
+        """
+        Number of states of the DFA (including the dead state).
+        """
+        return len(self.final)
+
+
+    def determinize(self, root, final, transitions):
+        """
+        Subset construction, each state of the DFA is a set of nodes of the
+        automaton. Only sets reachable from the initial node are created.
+
+        :args:
+            root        - index of the initial node
+            final       - set of indices of the accepting nodes
+            transitions - function, returns list of (label, target) tuples
+                          of the edges of a node
+        """
+        dead = frozenset()
+        start = frozenset( [root] )
+        states = {dead: 0, start: 1}
+        queue = [dead, start]
+        self.table = array('l', [0]) * (self.width * 2)
+        self.final = bytearray(2)
+        self.final[1] = 1 if start & final else 0
+        symbols = self.symbols
+
+        i = 1
+        while i < len(queue):
+            # Targets of the nodes in Q, by label
+            targets = {}
+            for q in queue[i]:
+                for a, j in transitions(q):
+                    targets.setdefault(a, set()).add(j)
+            for a, R in targets.items():
+                R = frozenset(R)
+                r = states.get(R)
+                if r is None:
+                    r = states[R] = len(queue)
+                    queue.append(R)
+                    self.table.extend( array('l', [0]) * self.width )
+                    self.final.append( 1 if R & final else 0 )
+                self.table[i * self.width + symbols[a]] = r
+            i += 1
+
+
+    def accepts(self, s):
+        """
+        Check if string s (or sequence of labels) is in the language of the
+        automaton.
+        """
+        table = self.table
+        width = self.width
+        unknown = width - 1
+        symbols = self.symbols
+        state = 1
+        for char in s:
+            state = table[state * width + symbols.get(char, unknown)]
+            if not state:
+                return False
+        return bool(self.final[state])
+
+
+    def accepts_many(self, strings):
+        """
+        Check a batch of strings. Strings are grouped by length, and each
+        group is matched at once: a vector of states is updated with one
+        table lookup per position.
+
+        :args:
+            strings     - iterable of strings
+        :returns:
+            accepted    - list of bools, in the same order as strings
+        """
+        strings = list(strings)
+        if numpy is None or not self.characters:
+            return [self.accepts(s) for s in strings]
+
+        groups = {}
+        for i, s in enumerate(strings):
+            groups.setdefault(len(s), []).append(i)
+
+        table = numpy.frombuffer(self.table, dtype='i%d' % self.table.itemsize)
+        table = table.reshape(-1, self.width)
+        final = numpy.frombuffer(bytes(self.final), dtype=numpy.uint8).astype(bool)
+        # Code points of the (sorted) alphabet, used to map characters to symbols
+        points = numpy.array([ord(a) for a in self.alphabet], dtype=numpy.uint32)
+        unknown = self.width - 1
+
+        accepted = [False] * len(strings)
+        for length, indices in groups.items():
+            states = numpy.ones(len(indices), dtype=table.dtype)
+            if length:
+                text = ''.join(strings[i] for i in indices)
+                chars = numpy.frombuffer(text.encode('utf-32-le'), dtype=numpy.uint32)
+                codes = numpy.full(len(chars), unknown)
+                if unknown:
+                    pos = numpy.minimum(numpy.searchsorted(points, chars), unknown - 1)
+                    codes = numpy.where(points[pos] == chars, pos, unknown)
+                codes = codes.reshape(len(indices), length)
+                for j in range(length):
+                    states = table[states, codes[:, j]]
+            for i, a in zip(indices, final[states]):
+                accepted[i] = bool(a)
+        return accepted
+
+
+def automaton_transitions(automaton):
+    """
+    Returns the used labels, root, accepting nodes and transitions of an
+    Automaton (see CompiledAutomaton.determinize()).
+    """
+    used = 0
+    for edges in automaton.out.values():
+        for mask in edges.values():
+            used |= mask
+    alphabet = automaton.alphabet
+    out = automaton.out
+
+    def transitions(q):
+        return [ (alphabet[a], j) for j, mask in out[q].items() for a in bits(mask) ]
+
+    final = {n.index for n in automaton.accepting_nodes}
+    return automaton.labels(used), automaton.root_index, final, transitions
+
+
+def file_transitions(F):
+    """
+    Same as automaton_transitions(), for an AutomatonFile. The edges of a
+    state are read from the mapped CSR arrays when the state is reached,
+    so the automaton is not copied.
+    """
+    alphabet = F.alphabet
+    offsets, targets, labels = F.offsets, F.targets, F.labels
+
+    def transitions(q):
+        start, end = offsets[q], offsets[q+1]
+        return [ (alphabet[a], j) for a, j in zip(labels[start:end], targets[start:end]) ]
+
+    return [alphabet[a] for a in set(labels)], F.root, set(F.accepting_states()), transitions
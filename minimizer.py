@@ -0,0 +1,142 @@
+from automaton import bits, duplicates
+from stats import NULL_STATS
+
+class Minimizer:
+    """
+    Merge equivalent states of an automaton with Hopcroft's partition
+    refinement algorithm (see Hopcroft, 1971), in O(n·|Σ|·log n).
+
+    Hopcroft's algorithm requires a deterministic automaton. The automata
+    learned by A0Learner are deterministic backwards (no node has two
+    incoming edges with the same label), but not necessarily forwards. So
+    there are two variants:
+        - forward:  minimize the automaton itself. Nodes are equivalent if
+                    they accept the same suffixes.
+        - reverse:  minimize the reversed automaton, i.e. with all edges
+                    reversed and the initial node as the only accepting
+                    node. Nodes are equivalent if they are reached by the
+                    same prefixes. Merging them does not change the
+                    language of the (original) automaton either.
+
+    Missing transitions go to an implicit dead node, which is removed again
+    afterwards. Equivalent nodes are merged in place.
+
+    """
+
+    def __init__(self, automaton, direction='auto', stats=None):
+        """
+        :args:
+            automaton   - instance of Automaton
+            direction   - (optional) one of:
+                            - forward: automaton should be deterministic,
+                            - reverse: automaton should be deterministic backwards,
+                            - auto: forward if possible, otherwise reverse.
+            stats       - (optional) instance of stats.Stats
+        """
+        self.A = automaton
+        self.stats = stats if stats else NULL_STATS
+        self.direction = direction
+        self.states_before = 0
+        self.states_after = 0
+
+
+    def minimize(self, verbose=False):
+        """
+        Merge all equivalent states of the automaton.
+
+        :args:
+            verbose     - print number of states before and after
+        :returns:
+            automaton   - the minimized Automaton (same instance)
+        """
+        direction = self.direction
+        if direction == 'auto':
+            direction = 'forward' if self.is_deterministic(self.A.out) else 'reverse'
+        if direction == 'forward':
+            edges = self.A.out
+            final = {n.index for n in self.A.accepting_nodes}
+        else:
+            edges = self.A.inc
+            final = {self.A.root.index}
+        if not self.is_deterministic(edges):
+            raise ValueError(f'Automaton is not deterministic ({direction}), unable to minimize.')
+
+        self.states_before = len(self.A.nodes)
+        with self.stats.stage('minimize'):
+            for block in self.partition(edges, final):
+                if len(block) > 1:
+                    self.A.merge_nodes( [self.A.get_node(i) for i in block] )
+            self.A.compact()
+        self.states_after = len(self.A.nodes)
+        self.stats.count('minimized_states', self.states_after)
+
+        if verbose:
+            print(f'Minimized automaton ({direction}): {self.states_before} -> {self.states_after} states.')
+        return self.A
+
+
+    def is_deterministic(self, edges):
+        return not any(duplicates(targets.values()) for targets in edges.values())
+
+
+    def partition(self, edges, final):
+        """
+        Hopcroft's partition refinement. We start with two blocks: the
+        accepting and the non-accepting nodes. A pair (B, a) of the worklist
+        splits every block into the nodes that have an a-edge to B and those
+        that don't. When a block is split, only the smaller half has to be
+        added to the worklist (unless the block was still in the worklist).
+
+        :args:
+            edges       - dict, edges[i][j] is the bitmask with the symbols
+                          of the edges from node i to node j
+            final       - set of indices of accepting nodes
+        :returns:
+            blocks      - list of sets of equivalent nodes
+        """
+        dead = -1
+        # Transition function, delta[i][a] is the target of the a-edge of node i
+        delta = {i: {a: j for j, mask in targets.items() for a in bits(mask)} for i, targets in edges.items()}
+        symbols = {a for labels in delta.values() for a in labels}
+
+        # Inverse transition function, inverse[a][j] is the list of nodes
+        # with an a-edge to node j (including the dead node)
+        inverse = {a: {} for a in symbols}
+        for i, labels in delta.items():
+            for a in symbols:
+                inverse[a].setdefault(labels.get(a, dead), []).append(i)
+        for a in symbols:
+            inverse[a].setdefault(dead, []).append(dead)
+
+        blocks = [set(final), set(edges) - final | {dead}]
+        blocks = [B for B in blocks if B]
+        block_of = {i: b for b, B in enumerate(blocks) for i in B}
+        smallest = min(range(len(blocks)), key=lambda b: len(blocks[b]))
+        worklist = {(smallest, a) for a in symbols}
+
+        while worklist:
+            b, a = worklist.pop()
+            # Nodes with an a-edge into block b, grouped by their block
+            touched = {}
+            for j in blocks[b]:
+                for i in inverse[a].get(j, ()):
+                    touched.setdefault(block_of[i], []).append(i)
+
+            for y, nodes in touched.items():
+                Y = blocks[y]
+                if len(nodes) == len(Y):
+                    continue
+                # Split block y, the nodes with an a-edge into b get a new block
+                Z = set(nodes)
+                Y -= Z
+                z = len(blocks)
+                blocks.append(Z)
+                for i in Z:
+                    block_of[i] = z
+                for c in symbols:
+                    if (y, c) in worklist:
+                        worklist.add( (z, c) )
+                    else:
+                        worklist.add( (y, c) if len(Y) < len(Z) else (z, c) )
+
+        return [B - {dead} for B in blocks if B - {dead}]
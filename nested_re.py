@@ -1,32 +1,73 @@
+import weakref
+
+LITERAL = 'literal'
+CLASS = 'class'
+EPSILON_OP = 'epsilon'
+UNION = 'union'
+CONCAT = 'concat'
+STAR = 'star'
+PLUS = 'plus'
+OPTIONAL = 'optional'
+
+CLOSURES = { STAR: '*', PLUS: '+', OPTIONAL: '?' }
+
 
 class NestedRE():
     """
-    Nested Regular expression. The goal is to simplify Regex patterns by
-    taking the intersection or unton of nested expressions and merging it
-    with other NestedRE instances.
-
-    TODO: This is work in progress, not completed yet. Only very basic 
-    merge / join is possible for now.
+    Nested Regular expression, an immutable node of an expression DAG. A node
+    is one of:
+        - literal       string label of an edge
+        - class         set of single characters: [abc]
+        - epsilon       the empty string ('ϵ')
+        - union         (A|B)
+        - concat        AB
+        - star, plus, optional
+                        closure of a single expression: A*, A+, A?
+
+    Nodes are hash-consed: creating a node that already exists returns the
+    existing instance. So identical expressions are the same object, they
+    can be compared by identity and subexpressions are shared instead of
+    copied. Joining two expressions therefore costs O(1), regardless of
+    their size.
+
+    The length of the flat string is computed when a node is created, the
+    flat string itself only when it is requested (and then cached).
+
+    Use the functions literal(), union(), concat(), star(), plus() and
+    optional() (or the methods join_union() and join_intersection()) to
+    create expressions, these apply some basic simplifications.
 
     :args:
-        exp     - ether string or a (nested) list of RE instances
-        closure - one of: '*', '+', '?' or '' if none.
-
+        op      - type of the node, one of the constants above
+        args    - string for literal, characters for class, otherwise
+                  child nodes
     """
 
-    def __init__(self, exp, closure=''):
+    __slots__ = ('op', 'args', 'length', 'flat', '__weakref__')
 
-        assert type(exp) is str or type(exp) is list, 'Expected string or list.'
+    # All existing nodes, indexed by (op, *args)
+    table = weakref.WeakValueDictionary()
 
-        self.exp = exp
-        self.closure = closure
+    def __new__(cls, op, *args):
+        key = (op,) + args
+        node = cls.table.get(key)
+        if node is None:
+            node = object.__new__(cls)
+            node.op = op
+            node.args = args
+            node.length = flat_length(op, args)
+            node.flat = None
+            cls.table[key] = node
+        return node
 
 
-    def __bool__(self):
+    def __reduce__(self):
         """
-        Check wether expression is empty.
+        Unpickled nodes are hash-consed as well. The DAG is pickled as a
+        table of its nodes (see to_table()), so pickle doesn't recurse once
+        per level of the expression.
         """
-        return bool(self.exp)
+        return (from_table, (to_table(self),))
 
 
     def __str__(self):
@@ -36,41 +77,56 @@ class NestedRE():
         return self.make_flat()
 
 
-    def is_flat(self):
-        return True if type(self.exp) == str else False
+    def __repr__(self):
+        return f'NestedRE({self.make_flat()!r})'
 
 
-    def make_flat(self):
+    def is_atomic(self):
         """
-        If we have simple expression, return just the concatenation of the 
-        expression and closure. If we have nested expressions, recursively
-        make them flat and concatenate.
+        Check whether a closure can be appended without parentheses.
         """
+        return self.op in (UNION, CLASS) or (self.op == LITERAL and len(self.args[0]) == 1)
 
-        if type(self.exp) == str:
-            if not self.closure or self.exp == 'ϵ':
-                return self.exp
-            elif len(self.exp) == 1:
-                return self.exp + self.closure
-            else:
-                return '(' + self.exp + ')' + self.closure
-        else:
-            flat_exp = ''.join( str(e) for e in self.exp )
-            if not self.closure or flat_exp == 'ϵ':
-                return flat_exp
-            elif len(flat_exp) == 1:
-                return flat_exp + self.closure
+
+    def make_flat(self):
+        """
+        Convert the expression into a string. We traverse the DAG with a stack
+        (so deep expressions don't hit the recursion limit) and collect all
+        parts in a list which is joined only once.
+        """
+        if self.flat is not None:
+            return self.flat
+
+        parts = []
+        stack = [self]
+        while stack:
+            x = stack.pop()
+            if type(x) is str:
+                parts.append(x)
+            elif x.flat is not None:
+                parts.append(x.flat)
+            elif x.op == LITERAL:
+                parts.append(x.args[0])
+            elif x.op == CLASS:
+                parts.append(class_text(x.args))
+            elif x.op == EPSILON_OP:
+                parts.append('ϵ')
+            elif x.op == UNION:
+                stack.extend( (')', x.args[1], '|', x.args[0], '(') )
+            elif x.op == CONCAT:
+                stack.extend( (x.args[1], x.args[0]) )
+            elif x.args[0].is_atomic():
+                stack.extend( (CLOSURES[x.op], x.args[0]) )
             else:
-                return '(' + flat_exp  + ')' + self.closure
+                stack.extend( (')' + CLOSURES[x.op], x.args[0], '(') )
+
+        self.flat = ''.join(parts)
+        return self.flat
 
 
     def join_intersection(self, other):
         """
-        Joins the patterns of self and other by intersection.
-        If the patterns are the same, we merge them. Otherwise
-        just concatenate. 
-        
-        TODO: merge complex and nested patterns
+        Joins the patterns of self and other by intersection (concatenation).
 
         :args:
             other - NestedRE instance
@@ -78,78 +134,12 @@ class NestedRE():
         :returns:
             X     - NestedRE with merged patterns
         """
+        return concat(self, other)
 
-        assert type(self) is type(other), 'Expected NestedRE instance'
-
-        A = self.make_flat()
-        B = other.make_flat()
-
-        #print('JI, A=', A, 'B=', B)
-
-        if A == B and A !='ϵ':
-            return self.merge_by_intersection(A, [self.closure, other.closure])
-        elif A == 'ϵ' and B == 'ϵ':
-            return NestedRE('ϵ')
-        elif A == 'ϵ':
-            return other
-        elif B == 'ϵ':
-            return self
-        else:
-            return NestedRE(A+B)
-
-
-    def merge_by_intersection(self, p, C):
-        """
-        Merge identical pattern with possibly different closures into one. 
-        Merge by intersection, i.e. by the following rules:
-       
-            p ^ p = pp
-            p ^ p? = pp?
-            p? ^ p? = a?a?
-            p ^ p+ = pp+
-            p ^ p* = p+
-            p? ^ p+ = p+
-            p+ ^ p* = p+
-            p+ ^ p+ = p+
-            p? ^ p* = p*
-            p* ^ p* = p*
-        
-        :args:
-            p       - string: pattern
-            C       - list of two elements, the closures of the two instances,
-                      should be one of:  '*', '+', '?' or '' if none.
-        :returns:
-            X       - NestedRE instance with merged pattern.
-        """
- 
-        if '' in C:
-            # At least one of two without clusure
-            if '?' in C:
-                return NestedRE(p+p, '?')
-            elif '*' in C:
-                return NestedRE(p, '+')
-            elif '+' in C:
-                return NestedRE(p+p, '+')
-            else:
-                # Both without closure
-                return NestedRE(p+p)
-        # At least one has "+"
-        elif '+' in C:
-            return NestedRE(p, '+')
-        elif '*' in C:
-            return NestedRE(p, '*')
-        # Only option left: both "?"
-        else:
-            return NestedRE(p+'?'+p+'?')
-            
 
     def join_union(self, other):
         """
         Joins the patterns of self and other by union.
-        If the patterns are the same, simply return one. Otherwise
-        concatenate with '|'. 
-        
-        TODO: merge complex and nested patterns
 
         :args:
             other - NestedRE instance
@@ -157,57 +147,388 @@ class NestedRE():
         :returns:
             X     - NestedRE with merged patterns
         """
+        return union(self, other)
+
 
-        assert type(self) is type(other), 'Expected NestedRE instance'
+def flat_length(op, args):
+    """
+    Length of the flat string of a node, computed from its children.
+    """
+    if op == LITERAL:
+        return len(args[0])
+    elif op == CLASS:
+        return len(class_text(args))
+    elif op == EPSILON_OP:
+        return 1
+    elif op == UNION:
+        return args[0].length + args[1].length + 3
+    elif op == CONCAT:
+        return args[0].length + args[1].length
+    else:
+        return args[0].length + (1 if args[0].is_atomic() else 3)
+
+
+def to_table(A):
+    """
+    Table of the nodes of the DAG of A in postorder, each row is a tuple of
+    the op and the args, where child nodes are replaced by their row. The
+    last row is A.
+    """
+    rows = {}
+    table = []
+    stack = [A]
+    while stack:
+        x = stack[-1]
+        if x in rows:
+            stack.pop()
+            continue
+        if x.op in (LITERAL, CLASS, EPSILON_OP):
+            args = x.args
+        else:
+            pending = [c for c in x.args if c not in rows]
+            if pending:
+                stack.extend(pending)
+                continue
+            args = tuple(rows[c] for c in x.args)
+        stack.pop()
+        rows[x] = len(table)
+        table.append( (x.op,) + args )
+    return table
+
+
+def from_table(table):
+    """
+    Expression of a table of to_table(), the nodes are hash-consed.
+    """
+    nodes = []
+    for op, *args in table:
+        if op not in (LITERAL, CLASS, EPSILON_OP):
+            args = [nodes[i] for i in args]
+        nodes.append( NestedRE(op, *args) )
+    return nodes[-1]
 
-        A = self.make_flat()
-        B = other.make_flat()
 
-        if A == B and A !='ϵ':
-            return self.merge_union(A, [self.closure, other.closure])
-        elif A == 'ϵ' and B == 'ϵ':
-            return NestedRE('ϵ')
-        elif A == 'ϵ':
-            return NestedRE(B, '?')
-        elif B == 'ϵ':
-            return NestedRE(A, '?')
+def class_text(chars):
+    """
+    String of a character class, runs of three or more consecutive
+    characters are written as ranges: [0-9a-f].
+    """
+    parts = []
+    i = 0
+    while i < len(chars):
+        j = i
+        while j + 1 < len(chars) and ord(chars[j+1]) == ord(chars[j]) + 1:
+            j += 1
+        if j - i >= 2:
+            parts.append(chars[i] + '-' + chars[j])
         else:
-            return NestedRE( '(' + A + '|' + B + ')' )
+            parts.extend(chars[i:j+1])
+        i = j + 1
+    return '[' + ''.join(parts) + ']'
 
 
-    def merge_by_union(self, p, C):
-        """
-        Merge identical pattern with possibly different closures into one. 
-        Merge by union, i.e. by the following rules:
+EPSILON = NestedRE(EPSILON_OP)
+
+
+def literal(text):
+    return NestedRE(LITERAL, text)
+
+
+def union(A, B):
+    """
+    Union of A and B, merge identical patterns:
+        a | a = a
+        ϵ | a = a | ϵ = a?
+    """
+    if A is B:
+        return A
+    elif A is EPSILON:
+        return optional(B)
+    elif B is EPSILON:
+        return optional(A)
+    return NestedRE(UNION, A, B)
 
-            a + a = a
-            a + a? = a?
-            a + a+ = a+
-            a? + a+ = a*
-            a + a* = a? + a* = a* + a* = a*
+
+def concat(A, B):
+    """
+    Concatenation of A and B, merge identical patterns:
+        ϵa = aϵ = a
+        a*a* = a*
+        aa* = a*a = a+
+    """
+    if A is EPSILON:
+        return B
+    elif B is EPSILON:
+        return A
+    elif A is B and A.op == STAR:
+        return A
+    elif B.op == STAR and B.args[0] is A:
+        return plus(A)
+    elif A.op == STAR and A.args[0] is B:
+        return plus(B)
+    return NestedRE(CONCAT, A, B)
+
+
+def star(A):
+    """
+    Kleene closure, closures are not nested: a** = a+* = a?* = a*
+    """
+    if A is EPSILON:
+        return EPSILON
+    elif A.op in CLOSURES:
+        A = A.args[0]
+    return NestedRE(STAR, A)
+
+
+def plus(A):
+    """
+    Positive closure: a++ = a+, a*+ = a?+ = a*
+    """
+    if A is EPSILON or A.op == PLUS:
+        return A
+    elif A.op in CLOSURES:
+        return star(A.args[0])
+    return NestedRE(PLUS, A)
+
+
+def optional(A):
+    """
+    Optional pattern: a?? = a?, a*? = a*, a+? = a*
+    """
+    if A is EPSILON or A.op in (STAR, OPTIONAL):
+        return A
+    elif A.op == PLUS:
+        return star(A.args[0])
+    return NestedRE(OPTIONAL, A)
+
+
+def char_class(chars):
+    """
+    Character class of a set of single characters (a literal if there is
+    only one character).
+    """
+    chars = tuple(sorted(set(chars)))
+    return literal(chars[0]) if len(chars) == 1 else NestedRE(CLASS, *chars)
+
+
+def factors(A):
+    """
+    List of factors of a concatenation, e.g. [a, (b|c), d*] for a(b|c)d*.
+    """
+    F = []
+    stack = [A]
+    while stack:
+        x = stack.pop()
+        if x.op == CONCAT:
+            stack.extend( (x.args[1], x.args[0]) )
+        elif x is not EPSILON:
+            F.append(x)
+    return F
+
+
+def concat_all(F):
+    """
+    Concatenation of a list of factors (ϵ for an empty list).
+    """
+    A = EPSILON
+    for x in reversed(F):
+        A = concat(x, A)
+    return A
+
+
+def alternatives(A):
+    """
+    List of alternatives of a union, e.g. [a, b, ϵ] for (a|b)?.
+    """
+    alts = []
+    stack = [A]
+    while stack:
+        x = stack.pop()
+        if x.op == UNION:
+            stack.extend( (x.args[1], x.args[0]) )
+        elif x.op == OPTIONAL:
+            stack.extend( (EPSILON, x.args[0]) )
+        else:
+            alts.append(x)
+    return alts
+
+
+def union_all(alts):
+    """
+    Union of a list of alternatives, ϵ makes the union optional.
+    """
+    A = None
+    for x in alts:
+        if x is not EPSILON:
+            A = x if A is None else union(A, x)
+    if A is None:
+        return EPSILON
+    return optional(A) if EPSILON in alts else A
+
+
+def is_char(A):
+    return A.op == CLASS or (A.op == LITERAL and len(A.args[0]) == 1)
+
+
+class Simplifier():
+    """
+    Rewrite engine that simplifies expressions bottom-up. Results are
+    memoized, so shared subexpressions are simplified only once (and since
+    REParser builds new labels from already simplified ones, only the new
+    nodes are visited).
+
+    Unions are treated as lists of alternatives, and the following rules are
+    applied to them:
+        - absorption:       a | a* = a*,  a | a+ = a+,  a+ | a* = a*,
+                            ϵ | a* = a*,  ϵ | a+ = a*
+        - character class:  a | b | [cd] = [a-d]
+        - common prefix:    ab | ac = a(b|c)
+        - common suffix:    ac | bc = (a|b)c
+    Factored unions are simplified again, so e.g. abc | abd = ab[cd].
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+
+    def simplify(self, A):
+        """
+        Simplify expression A and all its subexpressions.
 
         :args:
-            p       - string: pattern
-            C       - list of two strings, the closures of the two instances,
-                      should be one of:  '*', '+', '?' or '' if none.
+            A       - NestedRE instance
         :returns:
-            X       - NestedRE instance with merged pattern.            
-        """
-
-        assert len(A) == 2 and len(B) == 2, "[merge_disjunction] only simple re-s accepted"
-
-        if '*' in C:
-            # If any is *, then merged pattern is *
-            return NestedRE(p, '*')
-        elif '+' in C and '?' in C:
-            # One is mandatory, other optional, so merged pattern is * again
-            return NestedRE(p, '*')
-        elif '+' in C:
-            # One is mandatory, then merged pattern is mandatory
-            return NestedRE(p, '+')
-        elif '?' in C:
-            # One is optional, so merged pattern is optional
-            return NestedRE(p, '?')
+            X       - simplified NestedRE instance
+        """
+        cache = self.cache
+        stack = [A]
+        while stack:
+            x = stack[-1]
+            if x in cache:
+                stack.pop()
+                continue
+            pending = [c for c in x.args if type(c) is NestedRE and c not in cache]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            y = self.rewrite(x)
+            cache[x] = y
+            cache[y] = y
+        return cache[A]
+
+
+    def rewrite(self, x):
+        """
+        Rewrite node x, its children are already simplified.
+        """
+        if x.op in (LITERAL, CLASS, EPSILON_OP):
+            return x
+        C = [self.cache[c] for c in x.args]
+        if x.op == CONCAT:
+            return concat_all(factors(C[0]) + factors(C[1]))
+        elif x.op == STAR:
+            return star(C[0])
+        elif x.op == PLUS:
+            return plus(C[0])
+        elif x.op == OPTIONAL:
+            return self.simplify_union(alternatives(C[0]) + [EPSILON])
         else:
-            # Only option left: none has closure
-            return NestedRE(p)
\ No newline at end of file
+            return self.simplify_union(alternatives(C[0]) + alternatives(C[1]))
+
+
+    def simplify_union(self, alts):
+        """
+        Apply the union rules to a list of (simplified) alternatives.
+        """
+        alts = self.absorb( list(dict.fromkeys(alts)) )
+        alts = self.merge_classes(alts)
+        alts = self.factor(alts, 0)
+        alts = self.factor(alts, -1)
+        X = union_all(alts)
+        self.cache[X] = X
+        return X
+
+
+    def absorb(self, alts):
+        """
+        Drop alternatives that are already matched by a closure.
+        """
+        if EPSILON in alts and any(x.op == PLUS for x in alts):
+            # ϵ | a+ = a*
+            alts = [star(x.args[0]) if x.op == PLUS else x for x in alts]
+            alts = list(dict.fromkeys(alts))
+        stars = {x.args[0] for x in alts if x.op == STAR}
+        pluses = {x.args[0] for x in alts if x.op == PLUS}
+        return [x for x in alts if not (x in stars or x in pluses or \
+            (x.op == PLUS and x.args[0] in stars) or (x is EPSILON and stars))]
+
+
+    def merge_classes(self, alts):
+        """
+        Merge all single characters and classes into one class, which takes
+        the place of the first of them.
+        """
+        chars = [c for x in alts if is_char(x) for c in x.args]
+        if len(set(chars)) < 2:
+            return alts
+        C = char_class(chars)
+        new_alts = []
+        for x in alts:
+            if not is_char(x):
+                new_alts.append(x)
+            elif C:
+                new_alts.append(C)
+                C = None
+        return new_alts
+
+
+    def factor(self, alts, end):
+        """
+        Factor out common prefixes (end=0) or suffixes (end=-1) of the
+        alternatives. Alternatives with the same first (last) factor are
+        grouped and replaced by a single concatenation, at the place of the
+        first alternative of the group. The longest prefix (suffix) that is
+        common to the group is factored out at once, so long shared
+        prefixes don't add a level of recursion per factor.
+        """
+        F = [factors(x) for x in alts]
+        groups = {}
+        for i, f in enumerate(F):
+            if f:
+                groups.setdefault(f[end], []).append(i)
+        if all(len(g) < 2 for g in groups.values()):
+            return alts
+
+        new_alts = []
+        for i, x in enumerate(alts):
+            g = groups.get(F[i][end]) if F[i] else None
+            if not g or len(g) < 2:
+                new_alts.append(x)
+            elif g[0] == i:
+                n = common_length([F[j] for j in g], end)
+                if end == 0:
+                    rest = self.simplify_union( [concat_all(F[j][n:]) for j in g] )
+                    new_alts.append( concat_all(F[i][:n] + [rest]) )
+                else:
+                    rest = self.simplify_union( [concat_all(F[j][:len(F[j])-n]) for j in g] )
+                    for head in F[i][len(F[i])-n:]:
+                        rest = concat(rest, head)
+                    new_alts.append(rest)
+        return new_alts
+
+
+def common_length(F, end):
+    """
+    Length of the longest common prefix (end=0) or suffix (end=-1) of lists
+    of factors.
+    """
+    shortest = min(len(f) for f in F)
+    n = 0
+    while n < shortest:
+        k = n if end == 0 else -1 - n
+        x = F[0][k]
+        if any(f[k] is not x for f in F):
+            break
+        n += 1
+    return n
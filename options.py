@@ -0,0 +1,32 @@
+import sys
+
+# Values of option --minimize (see Minimizer)
+MINIMIZE = ('no', 'auto', 'forward', 'reverse')
+
+
+def get_option(argv, name, default=None, choices=None, multiple=False):
+    """
+    Returns value of an option given as "name=value", or the default
+    if the option is missing. If the value is not one of choices, prints
+    an error and exits.
+
+    :args:
+        argv        - list of arguments, argv[0] is the name of the script
+        name        - name of the option, e.g. '--engine'
+        default     - (optional) value if the option is missing
+        choices     - (optional) valid values
+        multiple    - (optional) the value is a comma separated list of
+                      choices
+    """
+    value = default
+    for arg in argv[1:]:
+        if arg.startswith(name + '='):
+            value = arg[len(name)+1:]
+    if choices:
+        values = value.split(',') if multiple else [value]
+        invalid = [v for v in values if v not in choices]
+        if invalid:
+            print('Invalid value for {}: [{}], expected one of: {}. Exiting.'.format(
+                name, ','.join(str(v) for v in invalid), ', '.join(str(c) for c in choices if c is not None)))
+            sys.exit(1)
+    return value
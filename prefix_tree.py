@@ -0,0 +1,256 @@
+import mmap
+import os
+from array import array
+from automaton import Automaton
+
+# Labels of the symbols of BytePrefixTree: byte b is the character chr(b),
+# so the examples are decoded as latin-1
+BYTE_ALPHABET = [chr(b) for b in range(256)]
+
+class PrefixTree:
+    """
+    Compact prefix tree (trie) of a set of examples. States are integers,
+    state 0 is the root. Instead of a Node object per state, the tree is
+    stored in flat arrays indexed by state:
+        - parent[i]     parent of state i
+        - label[i]      symbol of the edge from the parent to state i
+        - final[i]      1 if state i is accepting
+        - first_child[i], next_sibling[i]
+                        children of state i as a linked list (-1 is none)
+    Symbols are interned to integers, alphabet[label[i]] is the character
+    (or token). The children of all states are indexed in a single dict,
+    with keys state << 32 | symbol.
+
+    Examples are inserted one by one, they don't have to be sorted and
+    duplicates are ignored. So a file can be read line by line, without
+    holding the examples in memory.
+
+    :args:
+        examples    - (optional) iterable of strings
+    """
+
+    def __init__(self, examples=()):
+        self.parent = array('q', [-1])
+        self.label = array('q', [-1])
+        self.final = bytearray(1)
+        self.first_child = array('q', [-1])
+        self.next_sibling = array('q', [-1])
+        self.children = {}
+        self.alphabet = []
+        self.symbols = {}
+        for s in examples:
+            self.insert(s)
+
+
+    def __len__(self):
+        return len(self.parent)
+
+
+    @classmethod
+    def from_file(cls, fp, tokenizer=None):
+        """
+        Read examples from file, one example per line (an empty line is the
+        empty string).
+
+        :args:
+            fp          - path of the file
+            tokenizer   - (optional) instance of Tokenizer, examples are
+                          inserted as sequences of tokens
+        """
+        T = cls()
+        with open(fp) as f:
+            for line in f:
+                s = line.strip()
+                T.insert( tokenizer.tokenize(s) if tokenizer else s )
+        return T
+
+
+    def insert(self, s):
+        """
+        Add string s to the tree, only the part after the longest existing
+        prefix creates new states. s can also be a sequence of tokens (see
+        Tokenizer), each distinct token is a symbol.
+
+        :returns:
+            state   - int, the (accepting) state of s
+        """
+        state = 0
+        for char in s:
+            symbol = self.symbols.get(char)
+            if symbol is None:
+                symbol = self.symbols[char] = len(self.alphabet)
+                self.alphabet.append(char)
+            key = state << 32 | symbol
+            child = self.children.get(key)
+            if child is None:
+                child = self.add_state(state, symbol)
+                self.children[key] = child
+            state = child
+        self.final[state] = 1
+        return state
+
+
+    def add_state(self, parent, symbol):
+        state = len(self.parent)
+        self.parent.append(parent)
+        self.label.append(symbol)
+        self.final.append(0)
+        self.first_child.append(-1)
+        self.next_sibling.append(self.first_child[parent])
+        self.first_child[parent] = state
+        return state
+
+
+    def successors(self, state):
+        """
+        Returns list of (symbol, child) tuples of state.
+        """
+        S = []
+        child = self.first_child[state]
+        while child != -1:
+            S.append( (self.label[child], child) )
+            child = self.next_sibling[child]
+        return S
+
+
+    def strings(self):
+        """
+        Generator of all examples in the tree, in alphabetical order.
+        """
+        alphabet = self.alphabet
+        stack = [(0, '')]
+        while stack:
+            state, prefix = stack.pop()
+            if self.final[state]:
+                yield prefix
+            child = self.first_child[state]
+            # Most states have a single child, no need to sort
+            if child != -1 and self.next_sibling[child] == -1:
+                stack.append( (child, prefix + alphabet[self.label[child]]) )
+                continue
+            children = [ (alphabet[symbol], child) for symbol, child in self.successors(state) ]
+            for char, child in sorted(children, reverse=True):
+                stack.append( (child, prefix + char) )
+
+
+    def to_automaton(self, automaton=None, root=None):
+        """
+        Add the prefix tree to an automaton, as a path of nodes for each
+        example.
+
+        :args:
+            automaton   - (optional) instance of Automaton, a new one is
+                          created if missing
+            root        - (optional) Node that becomes the root state
+        :returns:
+            automaton   - instance of Automaton
+        """
+        A = automaton if automaton else Automaton()
+        if root is None:
+            root = A.add_node(is_initial=True, is_final=bool(self.final[0]))
+        symbols = A.add_symbols(self.alphabet)
+        nodes = [root.index]
+        for i in range(1, len(self)):
+            nodes.append( A.add_node_index(is_final=bool(self.final[i])) )
+            A.add_edge_mask(nodes[self.parent[i]], nodes[i], 1 << symbols[self.label[i]])
+        return A
+
+
+class BytePrefixTree(PrefixTree):
+    """
+    Prefix tree of binary examples (bytes-like objects). The alphabet is
+    fixed to the 256 byte values and the symbol of a byte is its value, so
+    inserting an example needs no lookup of symbols. The labels of the
+    symbols are the latin-1 characters (see BYTE_ALPHABET), strings() and
+    the learned automaton have the examples decoded as latin-1.
+
+    :args:
+        examples    - (optional) iterable of bytes, bytearray or memoryview
+    """
+
+    def __init__(self, examples=()):
+        super().__init__()
+        self.alphabet = list(BYTE_ALPHABET)
+        self.symbols = {char: b for b, char in enumerate(BYTE_ALPHABET)}
+        for s in examples:
+            self.insert(s)
+
+
+    @classmethod
+    def from_file(cls, fp, delimiter=b'\n', use_mmap=False):
+        """
+        Read binary examples from file, separated by delimiter (nothing is
+        stripped, a delimiter at the end of the file doesn't add an empty
+        example). Examples are inserted as slices of a memoryview of the
+        file, so they are not copied.
+
+        :args:
+            fp          - path of the file
+            delimiter   - (optional) non-empty bytes that separate examples
+            use_mmap    - (optional) map the file into memory instead of
+                          reading it
+        """
+        if not delimiter:
+            raise ValueError('Empty delimiter')
+        T = cls()
+        with open(fp, 'rb') as f:
+            if use_mmap and os.fstat(f.fileno()).st_size:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = f.read()
+            view = memoryview(data)
+            try:
+                start = 0
+                end = data.find(delimiter)
+                while end >= 0:
+                    T.insert( view[start:end] )
+                    start = end + len(delimiter)
+                    end = data.find(delimiter, start)
+                if start < len(data):
+                    T.insert( view[start:] )
+            finally:
+                # The map can't be closed while it is exported
+                view.release()
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        return T
+
+
+    def insert(self, s):
+        """
+        Add the bytes of s to the tree.
+
+        :returns:
+            state   - int, the (accepting) state of s
+        """
+        state = 0
+        children = self.children
+        i = 0
+        for symbol in s:
+            child = children.get(state << 32 | symbol)
+            if child is None:
+                break
+            state = child
+            i += 1
+        else:
+            self.final[state] = 1
+            return state
+        # The rest of s is a new path of states with a single child, they are
+        # appended without add_state()
+        rest = s[i:]
+        n = len(self.parent)
+        self.next_sibling.append(self.first_child[state])
+        self.first_child[state] = n
+        self.next_sibling.extend( [-1] * (len(rest) - 1) )
+        self.first_child.extend( range(n + 1, n + len(rest)) )
+        self.first_child.append(-1)
+        self.parent.append(state)
+        self.parent.extend( range(n, n + len(rest) - 1) )
+        self.label.extend(rest)
+        self.final.extend( bytes(len(rest)) )
+        for symbol in rest:
+            children[state << 32 | symbol] = n
+            state = n
+            n += 1
+        self.final[state] = 1
+        return state
@@ -1,6 +1,29 @@
 
-from automaton import Automaton, Node
-from nested_re import NestedRE
+import time
+from automaton import Automaton
+from nested_re import literal, union, union_all, concat_all, star, EPSILON, Simplifier
+from elimination_order import ORDERS
+from stats import Stats, NULL_STATS
+
+# Fallback results when a budget is exceeded (see REParser.fallback_expression())
+FALLBACKS = ('paths', 'alphabet', 'none')
+
+# Maximum length of the paths fallback if there is no length budget, and
+# maximum number of states it visits
+FALLBACK_LENGTH = 1000
+FALLBACK_STEPS = 100000
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised when the extraction exceeds a budget, budget is its name (time,
+    label_length or length).
+    """
+
+    def __init__(self, budget):
+        super().__init__(budget)
+        self.budget = budget
+
 
 class REParser():
 
@@ -20,14 +43,67 @@ class REParser():
 
     """
 
-    def __init__(self, automaton):
+    def __init__(self, automaton, order='list', simplify=True, stats=None, workers=0,
+            time_limit=None, max_label_length=None, max_length=None, fallback='paths', tokens=None):
         """
         :args:
             automaton   - an deterministic FSA, instance of Automaton
+            order       - (optional) order in which nodes are eliminated, one of:
+                            - list: order in which nodes were created,
+                            - static: lowest weight first, weights are computed once,
+                            - dynamic: lowest weight first, weights are updated
+                              after each elimination.
+                          (see elimination_order.py)
+            simplify    - (optional) simplify each new label with the
+                          rewrite rules of nested_re.Simplifier
+            stats       - (optional) instance of stats.Stats
+            workers     - (optional) if set, first eliminate the interior
+                          states of each strongly connected component
+                          (see eliminate_components()), in a pool of
+                          this many processes if more than one
+            time_limit  - (optional) budget of the extraction in seconds,
+                          a budget of 0 (or less) is already exceeded, so
+                          only the fallback is computed
+            max_label_length
+                        - (optional) budget of the length of each label
+                          derived during the extraction
+            max_length  - (optional) budget of the length of the final
+                          expression
+            fallback    - (optional) result if a budget is exceeded, one of:
+                            - paths: union of the shortest accepted words
+                              (a subset of the language),
+                            - alphabet: any string of the labels (a
+                              superset of the language),
+                            - none: no expression (use the automaton).
+                          the budget that was exceeded is self.exceeded
+            tokens      - (optional) dict of the labels that are not
+                          literals (tokens of character classes, see
+                          Tokenizer.expressions) and their expressions
         """
 
         self.A = automaton
+        self.order = ORDERS[order]
+        self.workers = workers
+        self.time_limit = time_limit
+        self.max_label_length = max_label_length
+        self.max_length = max_length
+        self.fallback = fallback
+        self.tokens = tokens if tokens else {}
+        self.deadline = None
+        self.exceeded = None
+        self.simplifier = Simplifier() if simplify else None
+        self.stats = stats if stats else NULL_STATS
         self.verbose = False
+        # Working copy of the edges of the automaton, succ[i][j] and pred[j][i]
+        # are the (same) expression, label of the edge from node i to node j.
+        # The automaton itself is not changed by the parser.
+        self.succ = {}
+        self.pred = {}
+        self.root = None
+        self.final = None
+        # Counters, only reported with stats
+        self.derivations = 0
+        self.peak_length = 0
 
 
     def parse(self, verbose=False):
@@ -37,48 +113,288 @@ class REParser():
         :args:
             verbose     - print a lot of info (useful for debugging)
         :returns:
-            regex       - string
+            regex       - NestedRE, label of the final edge (or None if
+                          the automaton accepts nothing)
         """
 
         self.verbose = verbose
+        with self.stats.stage('copy_edges'):
+            self.copy_edges()
+        if not self.final:
+            return None
 
         # Requirement of the SE algorithm, automaton should be uniform
         if not self.is_uniform():
             self.make_uniform()
             if verbose:
                 print('Converted to uniform Automaton')
-                self.A.show('Uniform 0-Automaton')
+                self.show('Uniform 0-Automaton')
         
         # List nodes to be eliminated, ignore initial and final states
-        nodes = [n for n in self.A.nodes if not (n.is_initial or n.is_final) ]
+        nodes = [i for i in self.succ if i not in (self.root, self.final[0])]
+        eliminations = 0
+        self.exceeded = None
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+        try:
+            if self.time_limit is not None and self.time_limit <= 0:
+                raise BudgetExceeded('time')
+            if self.workers:
+                with self.stats.stage('eliminate_components'):
+                    nodes, eliminations = self.eliminate_components(nodes)
+
+            with self.stats.stage('eliminate'):
+                eliminations += self.eliminate_all(nodes)
+
+            final_edge = self.succ[self.root].get(self.final[0])
+            if self.max_length and final_edge and final_edge.length > self.max_length:
+                raise BudgetExceeded('length')
+        except BudgetExceeded as ex:
+            self.exceeded = ex.budget
+            if verbose:
+                print(f'Budget exceeded: {ex.budget}, fallback: {self.fallback}')
+            with self.stats.stage('fallback'):
+                final_edge = self.fallback_expression()
+            self.stats.count('budget_exceeded')
 
+        self.stats.count('eliminations', eliminations)
+        self.stats.count('derive_pattern_calls', self.derivations)
+        self.stats.maximum('peak_expression_length', self.peak_length)
+        self.stats.maximum('expression_length', final_edge.length if final_edge else 0)
+
+        return final_edge
+
+
+    def eliminate_all(self, nodes):
+        """
+        Eliminate the nodes, in the order of self.order.
+
+        :args:
+            nodes       - list of indices of the nodes
+        :returns:
+            count       - number of eliminated nodes
+        """
+        nodes = self.order(self.succ, self.pred, nodes)
         i = 0
-        while nodes:    
+        while nodes:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise BudgetExceeded('time')
+
             # Choose node to be eliminated
-            k = nodes.pop(0)
-            new_edges = [ [ [] for i in range(self.A.esize)] for j in range(self.A.esize)]
-  
+            k = nodes.pop()
+
             # DEBUG
             i+=1
-            if verbose:
-                print(f'Loop={i}, N={len(nodes)}, Eliminating Node k={k.index}')
+            if self.verbose:
+                print(f'Loop={i}, N={len(nodes)}, Eliminating Node k={k}')
 
-            for n1 in list(self.A.nodes):
-                for n2 in list(self.A.nodes):
-                    if not (n1==k or n2==k):
-                        new_label = self.derive_pattern(n1, n2, k)
-                        if new_label:
-                            new_edges[n1.index][n2.index].append( new_label )
+            nodes.update( self.eliminate(k) )
 
-            self.A.delete_node(k)
-            self.A.edges = new_edges
+            if self.verbose:
+                self.show(f'i={i}')
+        return i
 
-            if verbose:
-                self.A.show(f'i={i}')
 
-        final_edge = self.A.edges[self.A.root.index][self.A.accepting_nodes[0].index]
+    def eliminate_components(self, nodes):
+        """
+        Eliminate the interior nodes of the strongly connected components
+        of the automaton, i.e. the nodes whose predecessors and successors
+        are all in the same component. Eliminating them only changes edges
+        within the component, so each component is done independently, on
+        a copy of its edges (in a process pool if self.workers > 1). The
+        edges between the remaining nodes of the component replace the
+        old ones.
 
-        return final_edge
+        :args:
+            nodes       - list of indices of the nodes to be eliminated
+        :returns:
+            nodes       - list of the nodes that are not eliminated yet
+            count       - number of eliminated nodes
+        """
+        nodes = set(nodes)
+        components = []
+        jobs = []
+        for C in strongly_connected_components(self.succ):
+            C = set(C)
+            interior = [k for k in C if k in nodes and C.issuperset(self.pred[k]) and C.issuperset(self.succ[k])]
+            if not interior:
+                continue
+            nodes.difference_update(interior)
+            succ = { i: {j: label for j, label in self.succ[i].items() if j in C} for i in C }
+            pred = { j: {i: label for i, label in self.pred[j].items() if i in C} for j in C }
+            components.append( (C, interior) )
+            jobs.append( (succ, pred, interior, self.order, bool(self.simplifier), self.stats.enabled) )
+        self.stats.count('components', len(jobs))
+
+        # Workers get the time that is left and the label budget
+        budget = (self.deadline - time.perf_counter() if self.deadline is not None else None, self.max_label_length)
+        jobs = [job + budget for job in jobs]
+        if self.workers > 1 and len(jobs) > 1:
+            # Imported here, it is the largest part of the startup time
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(min(self.workers, len(jobs)))
+            try:
+                results = list(pool.map(eliminate_interior, *zip(*jobs)))
+            finally:
+                # Don't start the other components if a budget is exceeded
+                pool.shutdown(cancel_futures=True)
+        else:
+            results = [eliminate_interior(*job) for job in jobs]
+
+        count = 0
+        for (C, interior), (edges, derivations, peak_length) in zip(components, results):
+            count += len(interior)
+            self.derivations += derivations
+            self.peak_length = max(self.peak_length, peak_length)
+            # Replace the edges within the component
+            for i in C:
+                for j in [j for j in self.succ[i] if j in C]:
+                    del self.succ[i][j]
+                    del self.pred[j][i]
+            for k in interior:
+                del self.succ[k]
+                del self.pred[k]
+            for i, targets in edges.items():
+                for j, label in targets.items():
+                    self.succ[i][j] = self.pred[j][i] = label
+        return [k for k in self.succ if k in nodes], count
+
+
+    def fallback_expression(self):
+        """
+        Result of the extraction if a budget is exceeded (see FALLBACKS). The
+        paths fallback takes the accepted words in order of their length
+        (breadth first, at most FALLBACK_STEPS states are visited), as long
+        as their union fits in the length budget.
+
+        :returns:
+            regex       - NestedRE or None
+        """
+        labels = {}
+        for n in self.A.nodes:
+            for j, node_labels in self.A.successors(n).items():
+                labels.setdefault(n.index, []).extend( (j, label) for label in node_labels )
+
+        if self.fallback == 'alphabet':
+            alphabet = sorted({label for edges in labels.values() for j, label in edges})
+            if not alphabet:
+                return EPSILON if self.A.root.is_final else None
+            P = star(union_all([self.label_expression(a) for a in alphabet]))
+            return self.simplifier.simplify(P) if self.simplifier else P
+
+        if self.fallback != 'paths':
+            return None
+        limit = self.max_length or FALLBACK_LENGTH
+        final = {n.index for n in self.A.accepting_nodes}
+        P = None
+        seen = set()
+        queue = [ (self.A.root.index, ()) ]
+        steps = 0
+        while steps < len(queue) and steps < FALLBACK_STEPS:
+            i, word = queue[steps]
+            steps += 1
+            w = self.word_expression(word) if i in final else None
+            if w is not None and w not in seen:
+                seen.add(w)
+                U = w if P is None else union(P, w)
+                if U.length > limit:
+                    break
+                P = U
+            if len(queue) < FALLBACK_STEPS:
+                queue.extend( (j, word + (label,)) for j, label in labels.get(i, ()) )
+
+        if P is not None and self.simplifier:
+            S = self.simplifier.simplify(P)
+            if S.length < P.length:
+                P = S
+        return P
+
+
+    def label_expression(self, label):
+        """
+        Expression of a label of the automaton.
+        """
+        X = self.tokens.get(label)
+        return X if X is not None else literal(label)
+
+
+    def word_expression(self, word):
+        """
+        Expression of a tuple of labels.
+        """
+        return concat_all([self.label_expression(label) for label in word])
+
+
+    def copy_edges(self):
+        """
+        Copy edges of the automaton into the tables self.succ and self.pred.
+        """
+        self.succ = { n.index: {} for n in self.A.nodes }
+        self.pred = { n.index: {} for n in self.A.nodes }
+        for n in self.A.nodes:
+            for j, labels in self.A.successors(n).items():
+                alts = [self.label_expression(label) for label in labels]
+                if self.simplifier:
+                    # The labels are simple, only their union is simplified
+                    # (simplify() would rewrite each nested union, which is
+                    # quadratic in the number of labels)
+                    P = self.simplifier.simplify_union(alts)
+                else:
+                    P = alts[0]
+                    for X in alts[1:]:
+                        P = union(P, X)
+                self.succ[n.index][j] = self.pred[j][n.index] = P
+        self.root = self.A.root.index
+        self.final = [n.index for n in self.A.accepting_nodes]
+
+
+    def eliminate(self, k):
+        """
+        Eliminate node k. Only edges between predecessors and successors of k
+        are updated, so this costs O(in(k) * out(k)).
+
+        :args:
+            k           - index of the node
+        :returns:
+            neighbours  - set of the predecessors and successors of k
+        """
+        P = [s for s in self.pred[k] if s != k]
+        S = [t for t in self.succ[k] if t != k]
+        new_edges = [ (s, t, self.derive_pattern(s, t, k)) for s in P for t in S ]
+        if self.simplifier:
+            new_edges = [ (s, t, self.simplifier.simplify(label)) for s, t, label in new_edges ]
+        self.derivations += len(new_edges)
+        if (self.stats.enabled or self.max_label_length) and new_edges:
+            self.peak_length = max(self.peak_length, max(label.length for s, t, label in new_edges))
+            if self.max_label_length and self.peak_length > self.max_label_length:
+                raise BudgetExceeded('label_length')
+
+        for s in P:
+            del self.succ[s][k]
+        for t in S:
+            del self.pred[t][k]
+        del self.succ[k]
+        del self.pred[k]
+
+        for s, t, new_label in new_edges:
+            self.succ[s][t] = self.pred[t][s] = new_label
+
+        return set(P) | set(S)
+
+
+    def add_node(self):
+        """
+        Add a node without edges to the tables, returns its index.
+        """
+        i = max(self.succ) + 1 if self.succ else 0
+        self.succ[i] = {}
+        self.pred[i] = {}
+        return i
+
+
+    def add_edge(self, i, j, label):
+        if j in self.succ[i]:
+            label = union(self.succ[i][j], label)
+        self.succ[i][j] = self.pred[j][i] = label
 
 
     def is_uniform(self):
@@ -89,16 +405,16 @@ class REParser():
         """
 
         # Class Automaton only allows one initial state, so only check incoming edges
-        if any(e[self.A.root.index] for e in self.A.edges):
+        # (and that it's not a final state as well)
+        if self.pred[self.root] or self.root in self.final:
             return False
 
         # There should be only one final state
-        if len(self.A.accepting_nodes) > 1:
+        if len(self.final) > 1:
             return False
 
         # Final state should not have outgoing edges
-        f = self.A.accepting_nodes[0]
-        if any( self.A.edges[f.index] ):
+        if self.succ[self.final[0]]:
             return False
 
         return True
@@ -114,22 +430,31 @@ class REParser():
 
         # If inital state is final state or if inital state has incoming edges
         # create new initial state with ϵ-transition the old one
-        if self.A.root in self.A.accepting_nodes or any(e[self.A.root.index] for e in self.A.edges):
-            new_root = self.A.add_node()
-            self.A.add_edge(new_root, self.A.root, 'ϵ')
-            self.A.root.is_initial = False
-            new_root.is_initial = True
-            self.A.root = new_root
+        if self.root in self.final or self.pred[self.root]:
+            new_root = self.add_node()
+            self.add_edge(new_root, self.root, EPSILON)
+            self.root = new_root
 
         # If there are more than one final states or a final state has outgoing edges
         # create new final state with ϵ-transition(s) to the old final state(s)
-        if len(self.A.accepting_nodes) > 1 or any(self.A.edges[self.A.accepting_nodes[0].index]):
-            new_final = self.A.add_node()
-            for f in self.A.accepting_nodes:
-                self.A.add_edge(f, new_final, 'ϵ')
-                f.is_final = False
-            new_final.is_final = True
-            self.A.accepting_nodes = [ new_final ]
+        if len(self.final) > 1 or self.succ[self.final[0]]:
+            new_final = self.add_node()
+            for f in self.final:
+                self.add_edge(f, new_final, EPSILON)
+            self.final = [ new_final ]
+
+
+    def show(self, title):
+        """
+        Draw the current state of the tables (which might differ from the
+        automaton).
+        """
+        A = Automaton()
+        nodes = { i: A.add_node(is_initial=i == self.root, is_final=i in self.final) for i in self.succ }
+        for i in self.succ:
+            for j, label in self.succ[i].items():
+                A.add_edge(nodes[i], nodes[j], str(label))
+        A.show(title)
 
 
     def derive_pattern(self, s, t, k):
@@ -142,43 +467,41 @@ class REParser():
         So the derived pattern is (L|R).
 
         args:
-            s       source, Node instance
-            t       target, Node instance
-            k       eliminated node, Node instance
+            s       source, index of Node
+            t       target, index of Node
+            k       eliminated node, index of Node
 
         returns:
-            P       string, if new edge between s and t is possible,
+            P       NestedRE, if new edge between s and t is possible,
                     None otherwise.
 
         """
 
-        s2t = NestedRE( '|'.join(self.A.edges[s.index][t.index]) )
-        s2k = NestedRE( '|'.join(self.A.edges[s.index][k.index]) )
-        k2k = NestedRE( '|'.join(self.A.edges[k.index][k.index]), '*' )
-        k2t = NestedRE( '|'.join(self.A.edges[k.index][t.index]) )
+        s2t = self.succ[s].get(t)
+        s2k = self.succ[s].get(k)
+        k2k = self.succ[k].get(k)
+        k2t = self.succ[k].get(t)
 
         if self.verbose:
             print('-' * 40)
-            print(f'Deriving pattern for pair: [s={s.index}, t={t.index}, k={k.index}]')
+            print(f'Deriving pattern for pair: [s={s}, t={t}, k={k}]')
             print('s2t; ', s2t)
             print('s2k; ', s2k)
             print('k2k; ', k2k)
             print('k2t; ', k2t)
         
         # Left-hand side of the pattern, which is just s2t or None if it's empty
-        L = s2t if s2t else None
+        L = s2t
 
         # Right-hand side of the pattern, take the intersection of the three patterns
         R = None
         if s2k and k2t:
-            #if s2k and s2k != ['ϵ']:
-            #    right_pattern.append(s2k)
             R = s2k
             if self.verbose:
                 print('[R = s2k]: ', str(R))
 
-            if k2k and str(k2k) != 'ϵ':
-                R = R.join_intersection(k2k)
+            if k2k:
+                R = R.join_intersection(star(k2k))
                 if self.verbose:
                     print('[R += k2k]: ', str(R))
 
@@ -198,8 +521,88 @@ class REParser():
         if self.verbose:
             print('[P=L|R]: ', P)
 
-        return str(P) if P else None
+        return P
 
 
     def get_automaton(self):
         return self.A
+
+
+def eliminate_interior(succ, pred, nodes, order, simplify, measure, time_limit=None, max_label_length=None):
+    """
+    Eliminate nodes from a copy of the edges of a component, this runs
+    in a worker process (see REParser.eliminate_components()).
+
+    :args:
+        succ, pred  - edges of the component, as in REParser
+        nodes       - list of indices of the nodes to be eliminated
+        order       - class of the elimination order
+        simplify    - simplify the new labels
+        measure     - compute the length of the longest label
+        time_limit, max_label_length
+                    - (optional) budgets, as in REParser
+    :returns:
+        succ        - edges between the remaining nodes
+        derivations - number of derived labels
+        peak_length - length of the longest derived label
+    """
+    parser = REParser(None, 'list', simplify, Stats() if measure else NULL_STATS, max_label_length=max_label_length)
+    parser.order = order
+    if time_limit is not None:
+        parser.deadline = time.perf_counter() + time_limit
+    parser.succ = succ
+    parser.pred = pred
+    parser.eliminate_all(nodes)
+    return parser.succ, parser.derivations, parser.peak_length
+
+
+def strongly_connected_components(succ):
+    """
+    Tarjan's algorithm, iterative so the depth of the automaton is not
+    limited by the recursion limit.
+
+    :args:
+        succ        - dict, succ[i] are the successors of node i
+    :returns:
+        components  - list of lists of nodes, in reverse topological
+                      order of the condensation
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for v in succ:
+        if v in index:
+            continue
+        index[v] = low[v] = len(index)
+        stack.append(v)
+        on_stack.add(v)
+        work = [ (v, iter(succ[v])) ]
+        while work:
+            u, children = work[-1]
+            for w in children:
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append( (w, iter(succ[w])) )
+                    break
+                if w in on_stack:
+                    low[u] = min(low[u], index[w])
+            else:
+                # All successors of u are done
+                work.pop()
+                if work:
+                    p = work[-1][0]
+                    low[p] = min(low[p], low[u])
+                if low[u] == index[u]:
+                    C = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        C.append(w)
+                        if w == u:
+                            break
+                    components.append(C)
+    return components
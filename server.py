@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from zr_learner import ENGINES
+from prefix_tree import PrefixTree
+from re_parser import REParser, FALLBACKS
+from elimination_order import ORDERS
+from minimizer import Minimizer
+from emitter import emit, DIALECTS
+from cache import strings_key, stage_key
+from options import get_option, MINIMIZE
+
+USAGE = """
+
+    Server mode of A0LREe - a long running process that answers requests,
+    so the startup cost is paid once and learned automata are kept in
+    memory. Requests are handled concurrently, learning and extraction run
+    in a pool of worker processes.
+
+    Usage:
+        ./server.py [options]
+
+    Protocol, one JSON object per line (responses are in order of
+    completion, with the id of the request):
+        {"id": 1, "op": "learn", "examples": ["ab", "aab"]}
+            -> {"id": 1, "status": "ok", "automaton": KEY, "states": 2}
+        {"id": 2, "op": "extract", "automaton": KEY}
+            -> {"id": 2, "status": "ok", "expression": "a+b", "length": 3}
+        {"id": 3, "op": "match", "automaton": KEY, "strings": ["ab", "b"]}
+            -> {"id": 3, "status": "ok", "matches": [true, false]}
+    extract also accepts "examples" instead of "automaton". Options of
+    the request, same as for a0lree.py:
+        learn           engine, minimize
+        extract         order, simplify, emit, anchor, time_budget,
+                        max_label_length, max_length, fallback
+    Failed requests have status "error" and an "error" message, an
+    expression of an exceeded budget has its name in "exceeded".
+
+    Arguments:
+        -h              print this message
+        --socket=PATH   listen on a Unix domain socket (default: read
+                        requests from stdin, write responses to stdout)
+        --workers=N     number of worker processes (default: number of CPUs)
+        --automata=N    number of automata kept in memory, least recently
+                        used are dropped first (default 128)
+    """
+
+# Longest request line in bytes
+LINE_LIMIT = 2**28
+
+
+def learn(examples, options):
+    """
+    Learn an automaton (in a worker process).
+
+    :args:
+        examples    - list of strings
+        options     - dict with engine and minimize
+    :returns:
+        automaton   - the learned Automaton
+    """
+    T = PrefixTree(examples)
+    L = ENGINES[options['engine']](T)
+    L.learn(False)
+    A = L.get_automaton()
+    if options['minimize'] != 'no':
+        Minimizer(A, options['minimize']).minimize()
+    return A
+
+
+def extract(automaton, options):
+    """
+    Extract the expression (in a worker process).
+
+    :returns:
+        text        - the expression, emitted in options['emit'] if set
+        exceeded    - name of the exceeded budget or None
+    """
+    P = REParser(automaton, options['order'], options['simplify'], None, 0, options['time_budget'],
+        options['max_label_length'], options['max_length'], options['fallback'])
+    e = P.parse(False)
+    if options['emit']:
+        text = emit(e, options['emit'], options['anchor'])
+    else:
+        text = str(e) if e else ''
+    return text, P.exceeded
+
+
+def compile_automaton(automaton):
+    return automaton.compile()
+
+
+def request_option(request, name, default, choices=None, kind=None):
+    """
+    Returns option of a request, raises ValueError if it is invalid.
+    """
+    value = request.get(name, default)
+    if choices and value not in choices:
+        raise ValueError('Invalid value for {}: [{}], expected one of: {}'.format(
+            name, value, ', '.join(str(c) for c in choices)))
+    if kind and value is not None and not isinstance(value, kind):
+        raise ValueError(f'Invalid value for {name}: [{value}]')
+    return value
+
+
+def learn_options(request):
+    return {
+        'engine': request_option(request, 'engine', 'fast', ENGINES),
+        'minimize': request_option(request, 'minimize', 'no', MINIMIZE),
+        }
+
+
+def extract_options(request):
+    return {
+        'order': request_option(request, 'order', 'list', ORDERS),
+        'simplify': request_option(request, 'simplify', True, (True, False)),
+        'emit': request_option(request, 'emit', None, (None,) + DIALECTS),
+        'anchor': request_option(request, 'anchor', True, (True, False)),
+        'time_budget': request_option(request, 'time_budget', None, kind=(int, float)),
+        'max_label_length': request_option(request, 'max_label_length', None, kind=int),
+        'max_length': request_option(request, 'max_length', None, kind=int),
+        'fallback': request_option(request, 'fallback', 'paths', FALLBACKS),
+        }
+
+
+class Server:
+    """
+    Handles requests (see USAGE). Learned automata are kept in an LRU
+    dictionary, keyed by the hash of their examples and options, together
+    with their compiled matcher and extracted expressions (once they are
+    requested).
+
+    :args:
+        workers         - (optional) number of worker processes
+        max_automata    - (optional) number of automata kept in memory
+    """
+
+    def __init__(self, workers=None, max_automata=128):
+        # Forked workers would inherit the locks held by other threads (e.g.
+        # the thread blocked reading stdin), workers of a fork server don't
+        self.context = None
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            self.context = multiprocessing.get_context('forkserver')
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(workers, mp_context=self.context)
+        self.max_automata = max(max_automata, 1)
+        self.automata = OrderedDict()
+
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+    async def run(self, f, *args):
+        """
+        Run f in the worker pool. A worker process that dies breaks the
+        pool, the requests that are running in it fail and the pool is
+        replaced for the next ones.
+        """
+        pool = self.pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, f, *args)
+        except BrokenProcessPool:
+            if self.pool is pool:
+                pool.shutdown(wait=False)
+                self.pool = ProcessPoolExecutor(self.workers, mp_context=self.context)
+            raise
+
+
+    def remember(self, key, automaton):
+        """
+        Add an automaton to the LRU, returns its entry.
+        """
+        entry = self.automata.get(key)
+        if entry is None:
+            entry = self.automata[key] = {'automaton': automaton, 'matcher': None, 'expressions': {}}
+            while len(self.automata) > self.max_automata:
+                self.automata.popitem(last=False)
+        self.automata.move_to_end(key)
+        return entry
+
+
+    def lookup(self, key):
+        entry = self.automata.get(key)
+        if entry is None:
+            raise ValueError(f'Unknown automaton [{key}]')
+        self.automata.move_to_end(key)
+        return entry
+
+
+    async def get_entry(self, request):
+        """
+        Entry of the automaton of a request, given by its key or learned
+        from the examples.
+        """
+        if 'automaton' in request:
+            return request['automaton'], self.lookup(request['automaton'])
+        examples = request.get('examples')
+        if not isinstance(examples, list) or not all(isinstance(s, str) for s in examples):
+            raise ValueError('Expected "automaton" or "examples" (list of strings)')
+        # The key is the same as of the PrefixTree of the examples (see
+        # cache.py), so a known set of examples is not learned again
+        options = learn_options(request)
+        key = stage_key(strings_key(sorted(set(examples))), **options)
+        entry = self.automata.get(key)
+        if entry is not None:
+            self.automata.move_to_end(key)
+            return key, entry
+        A = await self.run(learn, examples, options)
+        return key, self.remember(key, A)
+
+
+    async def handle(self, request):
+        """
+        Returns the response to a request (dict).
+        """
+        op = request.get('op')
+        if op == 'learn':
+            key, entry = await self.get_entry(request)
+            return {'automaton': key, 'states': len(entry['automaton'].nodes)}
+
+        elif op == 'extract':
+            options = extract_options(request)
+            key, entry = await self.get_entry(request)
+            options_key = stage_key(key, **options)
+            result = entry['expressions'].get(options_key)
+            if result is None:
+                result = await self.run(extract, entry['automaton'], options)
+                # Results of exceeded budgets depend on the load, they are not kept
+                if not result[1]:
+                    entry['expressions'][options_key] = result
+            text, exceeded = result
+            response = {'automaton': key, 'expression': text, 'length': len(text)}
+            if exceeded:
+                response['exceeded'] = exceeded
+            return response
+
+        elif op == 'match':
+            strings = request.get('strings')
+            if not isinstance(strings, list) or not all(isinstance(s, str) for s in strings):
+                raise ValueError('Expected "strings" (list of strings)')
+            key, entry = await self.get_entry(request)
+            if entry['matcher'] is None:
+                entry['matcher'] = await self.run(compile_automaton, entry['automaton'])
+            # Matching with the compiled table is cheap, it is done here
+            return {'automaton': key, 'matches': entry['matcher'].accepts_many(strings)}
+
+        raise ValueError(f'Unknown op [{op}], expected learn, extract or match')
+
+
+    async def respond(self, line, write):
+        """
+        Parse a request line, handle it and write the response. All
+        exceptions are caught, so a failing request doesn't affect the
+        others.
+        """
+        response = {'id': None, 'status': 'ok'}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Expected a JSON object')
+            response['id'] = request.get('id')
+            response.update( await self.handle(request) )
+        except Exception as ex:
+            response['status'] = 'error'
+            response['error'] = f'{type(ex).__name__}: {ex}'
+        await write( (json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8') )
+
+
+    async def serve(self, readline, write):
+        """
+        Handle the requests of one stream concurrently, until the end of
+        the stream.
+
+        :args:
+            readline    - coroutine function, returns the next line (bytes)
+            write       - coroutine function, writes a response line
+        """
+        tasks = set()
+        while True:
+            line = await readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.create_task( self.respond(line, write) )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+    async def serve_stdio(self):
+        """
+        Requests from stdin, responses to stdout. Lines are read in a thread,
+        so this works for pipes as well as files.
+        """
+        loop = asyncio.get_running_loop()
+        stdin = sys.stdin.buffer
+        stdout = sys.stdout.buffer
+
+        async def readline():
+            return await loop.run_in_executor(None, stdin.readline)
+
+        async def write(data):
+            stdout.write(data)
+            stdout.flush()
+
+        await self.serve(readline, write)
+
+
+    async def serve_socket(self, path):
+        """
+        Listen on a Unix domain socket, each connection is a stream of
+        requests. Stops on SIGTERM.
+        """
+        async def connection(reader, writer):
+            lock = asyncio.Lock()
+
+            async def write(data):
+                async with lock:
+                    writer.write(data)
+                    await writer.drain()
+
+            try:
+                await self.serve(reader.readline, write)
+            except (ConnectionError, ValueError) as ex:
+                # ValueError: the line is longer than LINE_LIMIT
+                print(f'Connection closed: {ex}', file=sys.stderr)
+            finally:
+                writer.close()
+
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        server = await asyncio.start_unix_server(connection, path, limit=LINE_LIMIT)
+        async with server:
+            await stop.wait()
+
+
+def main(argv):
+    if '-h' in argv or '--help' in argv:
+        print(USAGE)
+        sys.exit(0)
+
+    path = get_option(argv, '--socket')
+    try:
+        workers = get_option(argv, '--workers')
+        workers = int(workers) if workers else None
+        max_automata = int(get_option(argv, '--automata', '128'))
+    except ValueError as ex:
+        print(ex)
+        print('Invalid value for --workers or --automata. Exiting.')
+        sys.exit(1)
+
+    server = Server(workers, max_automata)
+    try:
+        if path:
+            asyncio.run(server.serve_socket(path))
+        else:
+            asyncio.run(server.serve_stdio())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
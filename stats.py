@@ -0,0 +1,159 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Stats:
+    """
+    Timings and counters of a run of the pipeline. Each stage is run in a
+    context:
+
+        with stats.stage('parse'):
+            ...
+
+    which adds its wall and CPU time (stages can be nested, and a stage
+    can run more than once). Counters are added with count(), and
+    maximum() keeps the largest value. Modules only report counts once
+    per stage (not inside their loops), and use NULL_STATS by default,
+    so without stats the pipeline does no extra work.
+
+    Stages can also be profiled with cProfile, or their peak memory
+    measured with tracemalloc (which slows down the stage considerably).
+
+    :args:
+        profile     - (optional) names of stages to profile, or 'all'
+        memory      - (optional) names of stages to trace memory, or 'all'
+    """
+
+    enabled = True
+
+    def __init__(self, profile=(), memory=()):
+        self.profile = set(profile)
+        self.memory = set(memory)
+        self.stages = {}
+        self.counters = {}
+        self.profiles = {}
+        # Peak memory of the traced stages that are running, nested stages
+        # reset the peak of tracemalloc, so it is passed on to the outer stage
+        self.peaks = []
+        self.profiling = False
+
+
+    @contextmanager
+    def stage(self, name):
+        # Profiling and tracing modules are imported only when used, so
+        # importing this module costs nothing when stats are disabled
+        profiler = None
+        tracing = name in self.memory or 'all' in self.memory
+        # Only one profiler can be active, nested stages are part of the
+        # profile of the outer stage
+        if (name in self.profile or 'all' in self.profile) and not self.profiling:
+            import cProfile
+            profiler = cProfile.Profile()
+            self.profiling = True
+        if tracing:
+            import tracemalloc
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            if self.peaks:
+                self.peaks[-1] = max(self.peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            self.peaks.append(base)
+        if profiler:
+            profiler.enable()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if profiler:
+                profiler.disable()
+                self.profiling = False
+                self.profiles.setdefault(name, []).append(profiler)
+            S = self.stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+            S['calls'] += 1
+            S['wall'] += wall
+            S['cpu'] += cpu
+            if tracing:
+                peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+                S['memory_peak'] = max(S.get('memory_peak', 0), peak - base)
+                if self.peaks:
+                    self.peaks[-1] = max(self.peaks[-1], peak)
+                if started:
+                    tracemalloc.stop()
+
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def maximum(self, name, value):
+        self.counters[name] = max(self.counters.get(name, value), value)
+
+
+    def report(self):
+        """
+        Returns dict with the stages (in order of first start) and counters.
+        """
+        return {
+            'stages': {name: dict(S, wall=round(S['wall'], 6), cpu=round(S['cpu'], 6)) \
+                for name, S in self.stages.items()},
+            'counters': dict(self.counters),
+            }
+
+
+    def to_json(self):
+        import json
+        return json.dumps(self.report(), indent=2)
+
+
+    def to_text(self):
+        lines = ['{:<24} {:>6} {:>10} {:>10}'.format('stage', 'calls', 'wall [s]', 'cpu [s]')]
+        for name, S in self.stages.items():
+            lines.append('{:<24} {:>6} {:>10.4f} {:>10.4f}'.format(name, S['calls'], S['wall'], S['cpu']))
+            if 'memory_peak' in S:
+                lines.append('{:<24} {:>6} {:>10}'.format('', 'peak', S['memory_peak']))
+        for name, value in self.counters.items():
+            lines.append('{:<24} {:>6}'.format(name, value))
+        return '\n'.join(lines)
+
+
+    def profile_text(self, limit=25):
+        """
+        Returns the profiles of the stages, sorted by cumulative time.
+        """
+        import io
+        import pstats
+        out = io.StringIO()
+        for name, profilers in self.profiles.items():
+            print(f'Profile of stage {name}:', file=out)
+            P = pstats.Stats(profilers[0], stream=out)
+            for profiler in profilers[1:]:
+                P.add(profiler)
+            P.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+
+class NullStats:
+    """
+    Stats that records nothing, the default of all modules.
+    """
+
+    enabled = False
+
+    def stage(self, name):
+        return nullcontext()
+
+
+    def count(self, name, n=1):
+        pass
+
+
+    def maximum(self, name, value):
+        pass
+
+
+NULL_STATS = NullStats()
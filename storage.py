@@ -0,0 +1,259 @@
+import mmap
+import struct
+import sys
+from array import array
+from automaton import Automaton, bits
+
+MAGIC = b'A0LA'
+VERSION = 1
+
+# magic, version, flags, number of states, number of edges, root (-1 if
+# there are no states), size of the alphabet
+HEADER = struct.Struct('<4sHHQQqQ')
+
+
+def padding(size):
+    """
+    Number of bytes needed to align size to 8 bytes.
+    """
+    return -size % 8
+
+
+def save(automaton, fp):
+    """
+    Write automaton to a binary file, the layout (all integers are little
+    endian, every section starts at a multiple of 8 bytes):
+        - header (see HEADER)
+        - alphabet: k+1 uint64 offsets into the utf-8 encoded labels,
+          followed by the labels
+        - transitions in CSR format: n+1 uint64 offsets into the edges,
+          the edges of state i are [offsets[i], offsets[i+1]). Then the
+          uint64 target and the uint32 label of each edge
+        - accepting states: bitmap of n bits, bit i%8 of byte i//8
+    Nodes are numbered in order of creation, symbols and edges are kept in
+    their order, so the loaded automaton has the same (compacted) indices
+    and gives the same expression.
+
+    :args:
+        automaton   - instance of Automaton
+        fp          - path of the file
+    """
+    nodes = list(automaton.nodes)
+    numbers = {n.index: i for i, n in enumerate(nodes)}
+    alphabet = automaton.alphabet
+
+    encoded = [a.encode('utf-8') for a in alphabet]
+    label_offsets = array('Q', [0])
+    for a in encoded:
+        label_offsets.append(label_offsets[-1] + len(a))
+
+    offsets = array('Q', [0])
+    targets = array('Q')
+    labels = array('I')
+    for n in nodes:
+        edges = automaton.out[n.index]
+        for j, mask in edges.items():
+            for a in bits(mask):
+                targets.append(numbers[j])
+                labels.append(a)
+        offsets.append(len(targets))
+
+    final = bytearray((len(nodes) + 7) // 8)
+    for n in automaton.accepting_nodes:
+        i = numbers[n.index]
+        final[i >> 3] |= 1 << (i & 7)
+
+    root = numbers[automaton.root.index] if nodes else -1
+    if sys.byteorder != 'little':
+        for A in (label_offsets, offsets, targets, labels):
+            A.byteswap()
+
+    with open(fp, 'wb') as f:
+        f.write( HEADER.pack(MAGIC, VERSION, 0, len(nodes), len(targets), root, len(alphabet)) )
+        blob = b''.join(encoded)
+        for section in (label_offsets, blob, offsets, targets, labels, final):
+            data = section.tobytes() if isinstance(section, array) else section
+            f.write(data)
+            f.write( bytes(padding(len(data))) )
+
+
+def load(fp):
+    """
+    Open an automaton written by save().
+
+    :returns:
+        automaton   - instance of AutomatonFile
+    """
+    return AutomatonFile(fp)
+
+
+class AutomatonFile:
+    """
+    Read-only view of an automaton file (see save() for the format). The
+    file is memory-mapped and the sections are used in place, so opening
+    it only reads the header and the alphabet, and processes that load the
+    same file share its pages. Use to_automaton() to get an Automaton
+    that can be changed (or passed to REParser), and compile() to match
+    strings without copying the automaton.
+
+    :args:
+        fp          - path of the file
+    """
+
+    def __init__(self, fp):
+        self.views = []
+        with open(fp, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.read_sections()
+        except ValueError:
+            self.close()
+            raise
+
+
+    def __len__(self):
+        return self.states
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def read_sections(self):
+        """
+        Check the header and create views of the sections of the file.
+        """
+        view = memoryview(self.buffer)
+        self.views.append(view)
+        if len(view) < HEADER.size:
+            raise ValueError('Not an automaton file (too short).')
+        magic, version, flags, n, m, root, k = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError('Not an automaton file (bad magic number).')
+        if version != VERSION:
+            raise ValueError(f'Unsupported version of automaton file: {version}.')
+        self.states = n
+        self.edges = m
+        self.root = root
+
+        position = HEADER.size
+        def section(size, fmt=None):
+            nonlocal position
+            if position + size > len(view):
+                raise ValueError('Automaton file is truncated.')
+            data = view[position:position+size]
+            self.views.append(data)
+            position += size + padding(size)
+            if fmt is None:
+                return data
+            if sys.byteorder != 'little':
+                data = array(fmt, data.tobytes())
+                data.byteswap()
+                return data
+            data = data.cast(fmt)
+            self.views.append(data)
+            return data
+
+        label_offsets = section(8 * (k + 1), 'Q')
+        blob = section(label_offsets[k]).tobytes()
+        self.alphabet = [blob[label_offsets[i]:label_offsets[i+1]].decode('utf-8') for i in range(k)]
+        self.offsets = section(8 * (n + 1), 'Q')
+        self.targets = section(8 * m, 'Q')
+        self.labels = section(4 * m, 'I')
+        self.final = section((n + 7) // 8)
+
+
+    def close(self):
+        """
+        Release the views and unmap the file.
+        """
+        self.offsets = self.targets = self.labels = self.final = None
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+
+
+    def is_final(self, i):
+        return bool(self.final[i >> 3] & (1 << (i & 7)))
+
+
+    def accepting_states(self):
+        """
+        Returns list of the accepting states, in increasing order.
+        """
+        states = []
+        for b, byte in enumerate(self.final):
+            while byte:
+                low = byte & -byte
+                states.append( (b << 3) + low.bit_length() - 1 )
+                byte ^= low
+        return states
+
+
+    def successors(self, i):
+        """
+        Returns list of (label, target) tuples of the edges of state i.
+        """
+        alphabet = self.alphabet
+        return [ (alphabet[self.labels[e]], self.targets[e]) for e in range(self.offsets[i], self.offsets[i+1]) ]
+
+
+    def to_automaton(self, automaton=None):
+        """
+        Copy the states and edges into an automaton. The arrays of the
+        automaton are built in bulk from the sections of the file, state i
+        of the file becomes node i (so the automaton is compact).
+
+        :args:
+            automaton   - (optional) empty instance of Automaton, a new one
+                          is created if missing
+        :returns:
+            automaton   - instance of Automaton
+        """
+        A = automaton if automaton else Automaton()
+        if A.size or A.node_index:
+            raise ValueError('Automaton file can only be copied into an empty automaton.')
+        n = self.states
+        powers = [1 << a for a in A.add_symbols(self.alphabet)]
+
+        final = bytearray(n)
+        for i in self.accepting_states():
+            final[i] = 1
+        A.live = bytearray(b'\x01') * n
+        A.final = final
+        A.size = n
+        A.root_index = self.root if self.root >= 0 else None
+
+        # The edges of a state are a contiguous slice of targets and labels,
+        # several labels between the same pair of states are one mask
+        out = {}
+        inc = {i: {} for i in range(n)}
+        offsets, targets, labels = self.offsets.tolist(), self.targets.tolist(), self.labels.tolist()
+        start = 0
+        for i in range(n):
+            end = offsets[i+1]
+            edges = out[i] = {}
+            for j, a in zip(targets[start:end], labels[start:end]):
+                edges[j] = edges.get(j, 0) | powers[a]
+            for j, mask in edges.items():
+                inc[j][i] = mask
+            start = end
+        A.out = out
+        A.inc = inc
+        return A
+
+
+    def compile(self):
+        """
+        Returns a table-driven matcher that reads the edges of the file in
+        place (see matcher.py).
+        """
+        from matcher import CompiledAutomaton
+        return CompiledAutomaton(self)
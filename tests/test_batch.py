@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch
+from prefix_tree import PrefixTree
+
+OPTIONS = {'engine': 'fast', 'minimize': 'no', 'order': 'list', 'simplify': True}
+
+
+class CrashingPrefixTree(PrefixTree):
+    """
+    Kills the worker process on the example "crash".
+    """
+
+    def __init__(self, examples, *args, **kwargs):
+        examples = list(examples)
+        if 'crash' in examples:
+            os._exit(1)
+        super().__init__(examples, *args, **kwargs)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+    reason='workers inherit the patched module only when forked')
+@pytest.mark.parametrize('workers', [1, 3])
+def test_dead_worker_fails_only_its_job(monkeypatch, workers):
+    monkeypatch.setattr(batch, 'PrefixTree', CrashingPrefixTree)
+    jobs = [{'id': i, 'examples': ['a' * i + 'b', 'b']} for i in range(1, 8)]
+    jobs.insert(3, {'id': 'bad', 'examples': ['crash']})
+
+    results = {r['id']: r for r in batch.run_batch(jobs, OPTIONS, workers)}
+
+    assert set(results) == {job['id'] for job in jobs}
+    assert results['bad']['status'] == 'error'
+    assert results['bad']['error'] == 'Worker process died'
+    for i in range(1, 8):
+        assert results[i]['status'] == 'ok', results[i]
@@ -0,0 +1,62 @@
+import itertools
+import os
+import random
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from elimination_order import ORDERS
+from emitter import emit, DIALECTS
+from prefix_tree import PrefixTree
+from re_parser import REParser
+from zr_learner import ENGINES
+
+# Labels with special characters, but none that POSIX classes write
+# differently than Python (backslash, brackets, ^ and -)
+ALPHABET = 'ab.*'
+
+
+def example_sets():
+    rng = random.Random(1)
+    sets = [['b', 'ab', 'aab'], ['', 'a.', 'a.b*'], ['ab', 'a*', '.b']]
+    for _ in range(6):
+        sets.append([''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 5))) for _ in range(rng.randint(1, 8))])
+    return sets
+
+
+def strings(length):
+    for n in range(length + 1):
+        for chars in itertools.product(ALPHABET + 'x', repeat=n):
+            yield ''.join(chars)
+
+
+def compile_pattern(pattern, dialect):
+    """
+    The patterns of all dialects are compiled with re, which has the same
+    syntax for them except the end anchor of pcre.
+    """
+    if dialect == 'pcre' and pattern.endswith('\\z'):
+        pattern = pattern[:-2] + '\\Z'
+    return re.compile(pattern)
+
+
+@pytest.mark.parametrize('order', ORDERS)
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_emitted_pattern_matches_automaton(order, dialect):
+    for examples in example_sets():
+        L = ENGINES['fast'](PrefixTree(examples))
+        L.learn(False)
+        A = L.get_automaton()
+        M = A.compile()
+        rx = compile_pattern(emit(REParser(A, order).parse(), dialect), dialect)
+        for s in strings(4):
+            assert bool(rx.search(s)) == M.accepts(s), (examples, s)
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_empty_language_matches_nothing(dialect):
+    rx = compile_pattern(emit(None, dialect), dialect)
+    assert not any(rx.search(s) for s in strings(2))
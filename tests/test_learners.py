@@ -0,0 +1,60 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefix_tree import PrefixTree
+from zr_learner import ENGINES
+
+
+def example_sets():
+    rng = random.Random(0)
+    sets = [['b', 'ab', 'aab'], ['', 'a', 'ab', 'ba'], ['abc', 'abd', 'xbd', 'xyz', 'x']]
+    for _ in range(20):
+        sets.append([''.join(rng.choice('abc') for _ in range(rng.randint(0, 6))) for _ in range(rng.randint(1, 10))])
+    return sets
+
+
+def learn(engine, examples):
+    L = ENGINES[engine](PrefixTree(examples))
+    L.learn(False)
+    return L.get_automaton()
+
+
+def canonical(A):
+    """
+    Edges and initial node of A, with nodes numbered in the order they are
+    reached backwards from the accepting node. A 0-reversible automaton
+    has one accepting node and is deterministic backwards, so equal
+    automata get equal numbers.
+    """
+    final = A.accepting_nodes[0].index
+    numbers = {final: 0}
+    queue = [final]
+    edges = set()
+    for j in queue:
+        incoming = sorted( (label, i) for i, mask in A.inc[j].items() for label in A.labels(mask) )
+        for label, i in incoming:
+            if i not in numbers:
+                numbers[i] = len(numbers)
+                queue.append(i)
+            edges.add( (numbers[i], label, numbers[j]) )
+    assert len(numbers) == len(A.nodes)
+    return numbers[A.root.index], edges
+
+
+@pytest.mark.parametrize('examples', example_sets())
+def test_engines_learn_the_same_automaton(examples):
+    fast = learn('fast', examples)
+    reference = learn('reference', examples)
+    assert len(fast.nodes) == len(reference.nodes)
+    assert canonical(fast) == canonical(reference)
+
+
+@pytest.mark.parametrize('examples', example_sets())
+def test_automaton_accepts_examples(examples):
+    M = learn('fast', examples).compile()
+    assert all(M.accepts(s) for s in examples)
@@ -0,0 +1,49 @@
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emitter import emit
+from nested_re import Simplifier, literal, concat_all, union
+from prefix_tree import PrefixTree
+from re_parser import REParser
+from zr_learner import ENGINES
+
+
+def word(s):
+    return concat_all([literal(c) for c in s])
+
+
+def test_factor_common_prefix_and_suffix():
+    S = Simplifier()
+    assert str(S.simplify(union(word('abc'), word('abd')))) == 'ab[cd]'
+    assert str(S.simplify(union(word('xab'), word('yab')))) == '[xy]ab'
+
+
+def test_long_common_prefix():
+    p = ''.join('abcdefgh'[i % 8] for i in range(1200))
+    S = Simplifier()
+    e = S.simplify(union(word(p + 'xq'), word(p + 'yr')))
+    assert str(e) == p + '(xq|yr)'
+
+
+def test_long_common_prefix_pipeline():
+    p = ''.join('abcdefgh'[i % 8] for i in range(1200))
+    examples = [p + 'xq', p + 'yr', 'z' + p + 'x']
+    L = ENGINES['fast'](PrefixTree(examples))
+    L.learn(False)
+    e = REParser(L.get_automaton(), 'list', True).parse(False)
+    rx = re.compile(emit(e, 'python'))
+    assert all(rx.match(s) for s in examples)
+
+
+def test_epsilon_character_is_a_literal():
+    e = literal('ϵ')
+    assert e.op == 'literal' and e.args == ('ϵ',)
+    examples = ['aϵb', 'ab']
+    L = ENGINES['fast'](PrefixTree(examples))
+    L.learn(False)
+    e = REParser(L.get_automaton(), 'list', True).parse(False)
+    rx = re.compile(emit(e, 'python'))
+    assert all(rx.match(s) for s in examples)
@@ -0,0 +1,59 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automaton import Automaton
+from nested_re import literal, concat_all, star, union
+from re_parser import REParser
+
+
+def cycles(count, length):
+    """
+    Automaton with count cycles of length nodes between the initial and
+    the accepting node, each cycle is a strongly connected component.
+    """
+    A = Automaton()
+    root = A.add_node(is_initial=True)
+    final = A.add_node(is_final=True)
+    for c in range(count):
+        nodes = [A.add_node() for _ in range(length)]
+        for k in range(length - 1):
+            A.add_edge(nodes[k], nodes[k+1], 'a')
+        A.add_edge(nodes[-1], nodes[0], 'b')
+        A.add_edge(root, nodes[0], str(c))
+        A.add_edge(nodes[-1], final, 'c')
+    return A
+
+
+def test_pickle_deep_expression():
+    e = concat_all([star(union(literal('a'), literal(str(i)))) for i in range(5000)])
+    assert pickle.loads(pickle.dumps(e)) is e
+
+
+def test_parallel_components_with_deep_labels():
+    A = cycles(2, 1500)
+    expected = REParser(A, 'list', False, workers=1).parse()
+    assert str(REParser(A, 'list', False, workers=2).parse()) == str(expected)
+
+
+def learn(examples):
+    from prefix_tree import PrefixTree
+    from zr_learner import ENGINES
+    L = ENGINES['fast'](PrefixTree(examples))
+    L.learn(False)
+    return L.get_automaton()
+
+
+def test_time_budget_zero_gives_simplified_fallback():
+    P = REParser(learn(['abc', 'abd', 'abe']), time_limit=0)
+    e = P.parse()
+    assert P.exceeded == 'time'
+    assert str(e) == 'ab[c-e]'
+
+
+def test_no_time_budget():
+    P = REParser(learn(['abc', 'abd', 'abe']), time_limit=None)
+    P.parse()
+    assert P.exceeded is None
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automaton import Automaton
+from prefix_tree import PrefixTree
+from re_parser import REParser
+from storage import AutomatonFile, HEADER
+from zr_learner import ENGINES
+
+
+def learned(examples):
+    L = ENGINES['fast'](PrefixTree(examples))
+    L.learn(False)
+    A = L.get_automaton()
+    A.compact()
+    return A
+
+
+def edges(A):
+    return {(i, j, label) for i in A.out for j, mask in A.out[i].items() for label in A.labels(mask)}
+
+
+@pytest.mark.parametrize('examples', [['b', 'ab', 'aab'], ['', 'ϵ', 'äb', 'x y'], ['abc', 'abd', 'xbd', 'x']])
+def test_round_trip(tmp_path, examples):
+    A = learned(examples)
+    fp = tmp_path / 'a.a0la'
+    A.save(fp)
+    B = Automaton.load(fp)
+    assert len(B.nodes) == len(A.nodes)
+    assert B.root.index == A.root.index
+    assert [n.index for n in B.accepting_nodes] == [n.index for n in A.accepting_nodes]
+    assert edges(B) == edges(A)
+    assert str(REParser(B).parse()) == str(REParser(A).parse())
+
+
+def test_compile_from_file(tmp_path):
+    A = learned(['b', 'ab', 'cab'])
+    fp = tmp_path / 'a.a0la'
+    A.save(fp)
+    with AutomatonFile(fp) as F:
+        M = F.compile()
+    N = A.compile()
+    assert M.table == N.table and M.final == N.final
+
+
+def test_invalid_files(tmp_path):
+    fp = tmp_path / 'a.a0la'
+    fp.write_bytes(b'A0LA')
+    with pytest.raises(ValueError):
+        Automaton.load(fp)
+    learned(['ab']).save(fp)
+    fp.write_bytes(fp.read_bytes()[:HEADER.size + 4])
+    with pytest.raises(ValueError):
+        Automaton.load(fp)
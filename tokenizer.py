@@ -0,0 +1,73 @@
+import re
+import string
+from nested_re import plus, char_class
+
+# Tokenizer modes (option --tokenize)
+TOKENIZERS = ('regex', 'delimiter', 'class')
+
+# Character classes of the class mode, a run of characters of a class is
+# one token
+CLASSES = (string.digits, string.ascii_letters)
+
+
+class Tokenizer:
+    """
+    Splits examples into tokens, so the learner works with an alphabet of
+    tokens instead of characters: the prefix tree interns each distinct
+    token to a symbol, and an example of n tokens is a path of n states.
+    Every character of an example is part of a token, so the concatenated
+    tokens are the example. Modes:
+        - regex: tokens are the matches of a regular expression, each
+          character between matches is a token,
+        - delimiter: tokens are the parts between delimiters, and the
+          delimiters,
+        - class: a run of digits or of (ASCII) letters is one token that
+          stands for the whole class ([0-9]+ or [A-Za-z]+), any other
+          character is a token.
+
+    Tokens are labels of the automaton. Labels of literal tokens are their
+    text, labels of class tokens are the flat strings of their expressions,
+    self.expressions maps these labels back to the expressions (see
+    REParser, argument tokens).
+
+    :args:
+        mode        - (optional) one of TOKENIZERS
+        pattern     - (optional) regular expression of a token (regex mode)
+        delimiter   - (optional) non-empty string (delimiter mode)
+    """
+
+    def __init__(self, mode='regex', pattern=r'\w+', delimiter=' '):
+        if mode not in TOKENIZERS:
+            raise ValueError(f'Unknown tokenizer [{mode}], expected one of: {", ".join(TOKENIZERS)}')
+        self.mode = mode
+        self.expressions = {}
+        self.class_labels = []
+        if mode == 'regex':
+            try:
+                self.regex = re.compile(f'(?:{pattern})|.', re.S)
+            except re.error as ex:
+                raise ValueError(f'Invalid token pattern [{pattern}]: {ex}')
+        elif mode == 'delimiter':
+            if not delimiter:
+                raise ValueError('Empty delimiter')
+            d = re.escape(delimiter)
+            self.regex = re.compile(f'{d}|(?:(?!{d}).)+', re.S)
+        else:
+            self.regex = re.compile(''.join(f'([{re.escape(chars)}]+)|' for chars in CLASSES) + '(.)', re.S)
+            for chars in CLASSES:
+                X = plus(char_class(chars))
+                self.expressions[str(X)] = X
+                self.class_labels.append(str(X))
+
+
+    def tokenize(self, s):
+        """
+        Returns tuple of the tokens (labels) of string s.
+        """
+        if self.mode != 'class':
+            # Empty matches of the pattern are dropped, the next character
+            # is matched by '.'
+            return tuple(m.group() for m in self.regex.finditer(s) if m.end() > m.start())
+        labels = self.class_labels
+        return tuple(m.group() if m.lastindex > len(labels) else labels[m.lastindex - 1] \
+            for m in self.regex.finditer(s))
@@ -0,0 +1,64 @@
+"""
+Drawing of automata with graphviz and Qt. Both packages are optional, this
+module is only imported when a graph is drawn (i.e. with -v).
+"""
+
+import sys
+import time
+from graphviz import Digraph
+from PyQt5 import QtGui, QtWidgets
+
+graph_fp = 'graphs/dfs_' + str(round(time.time()))
+
+
+def show(automaton, title='Finite State Automaton'):
+    """
+    Open a QT window and draw Automaton with graphviz.
+    """
+    graph = make_graph(automaton)
+    graph.render()
+    App = QtWidgets.QApplication(sys.argv)
+    W = QtWidgets.QWidget()
+    L = QtWidgets.QLabel(W)
+    L.setText("Your Finite State Automaton:")
+    P = QtGui.QPixmap(graph_fp + '.png')
+    L.setPixmap(P)
+    W.setGeometry(0, 0, P.width()+100, P.height()+50)
+    L.move(50,20)
+    W.setWindowTitle(title)
+    W.show()
+    App.exec_()        
+
+
+def make_graph(automaton):
+    """
+    Construct a graphviz graph of the automaton.
+    """
+    graph = Digraph('finite_state_machine', format='png', filename=graph_fp)
+    graph.attr(rankdir='LR', size='10')        
+    # Add all nodes
+    for node in automaton.nodes:
+        if node == automaton.root or node.is_initial:
+            graph.attr('node', 
+                            width='0.8', 
+                            height='0.8', 
+                            shape='circle', 
+                            style='filled', 
+                            fillcolor='yellow' )
+        if node.is_final:
+            graph.attr( 'node', 
+                            shape='doublecircle', 
+                            style='filled', 
+                            fillcolor='lightskyblue' )
+        else:
+            graph.attr( 'node', 
+                            shape='circle', 
+                            style='filled', 
+                            fillcolor='azure2' )
+        label = '<q<SUB><FONT POINT-SIZE="10">' + str(node.index) + '</FONT></SUB>>'
+        graph.node( str(node.index), label=label )
+    # Add edges
+    for node in automaton.nodes:
+        for j, labels in automaton.successors(node).items():
+            graph.edge(str(node.index), str(j), label=''.join(labels))
+    return graph
@@ -0,0 +1,280 @@
+from array import array
+from a0_learner import A0Learner
+
+class ZRLearner(A0Learner):
+    """
+    Near-linear implementation of the Zero-Reversible Inference Algorithm
+    (Angluin, 1982). It learns the same automaton as A0Learner, but instead
+    of repeatedly scanning all nodes for nd-transitions, states are merged
+    with a union-find structure and a worklist of pending merges.
+
+    Every block (set of merged states) keeps a table of its predecessors
+    (and if deterministic is set, also of its successors), which maps each
+    label to one representative node. When two blocks are merged, their
+    tables are merged as well and every label that occurs in both tables
+    gives a new pair of blocks that have to be merged. Since we always
+    iterate over the smaller of the two tables, the total cost is nearly
+    linear in the number of edges of the prefix tree.
+
+    The learner works directly on the states of the PrefixTree: union-find
+    is stored in arrays and tables are only created for blocks with more
+    than one state (a single state has exactly one predecessor in the tree).
+    Nodes of the automaton are only created for the final blocks.
+
+    The prefix tree, union-find and tables are kept after learning, so
+    examples can be added later with add_examples(), at a cost proportional
+    to the new states and merges instead of the whole set of examples.
+
+    """
+
+    def __init__(self, examples=None, automaton=None, deterministic=False, stats=None):
+        """
+        :args:
+            automaton       - (optional) instance of Automaton class
+            examples        - list of strings (this can include the empty string ''),
+                              or instance of PrefixTree
+            deterministic   - (optional) also merge nodes with outgoing
+                              nd-transitions (A0Learner only merges nodes
+                              with incoming nd-transitions)
+            stats           - (optional) instance of stats.Stats
+        """
+        super().__init__(examples, automaton, stats)
+        self.deterministic = deterministic
+        self.parent = array('q')
+        self.size = array('q')
+        self.pred = {}
+        self.succ = {}
+        self.pending = []
+        self.block_nodes = {}
+        self.final_state = None
+
+
+    def learn(self, verbose=True):
+        """
+        Constructs zero-reversible automaton in two stages:
+        - Find blocks of states of the prefix tree with union-find,
+          starting with the block of final states
+        - Create a node for each block.
+
+        :args:
+            verbose     - draw all intermediate graphs
+        """
+
+        self.verbose = verbose
+
+        if verbose:
+            self.T.to_automaton().show(title='Prefix Tree')
+
+        with self.stats.stage('init_blocks'):
+            self.init_blocks()
+        self.stats.count('prefix_tree_states', len(self.T))
+        with self.stats.stage('merge_final_states'):
+            self.merge_final_states()
+        with self.stats.stage('merge_pending'):
+            self.merge_pending()
+
+        with self.stats.stage('construct_automaton'):
+            self.construct_automaton()
+        self.stats.count('states', len(self.A.nodes))
+        self.learned = True
+        if verbose:
+            self.A.show(title='Automaton with merged non-deterministic transitions')
+
+
+    def add_examples(self, examples):
+        """
+        Add examples to the learned automaton, in place. Only the new states
+        of the prefix tree are added to the union-find, the worklist is
+        seeded with the states that became final (and in deterministic mode
+        with the new successors of merged blocks). The nodes of blocks that
+        are merged by the worklist are merged in the automaton, and nodes and
+        edges are added for the new states.
+
+        The automaton should not have been changed after learning (e.g. by
+        Minimizer). Before learn() is called, the examples are only added to
+        the prefix tree.
+
+        :args:
+            examples    - iterable of strings
+        :returns:
+            automaton   - the updated Automaton
+        """
+        with self.stats.stage('add_examples'):
+            return self.update(examples)
+
+
+    def update(self, examples):
+        """
+        Insert the examples and update the blocks and the automaton (see
+        add_examples()).
+        """
+        T = self.T
+        n = len(T)
+        final = [T.insert(s) for s in examples]
+        self.Σ = self.A.add_symbols(T.alphabet)
+        if not self.learned:
+            return self.A
+
+        self.parent.extend( range(n, len(T)) )
+        self.size.extend( array('q', [1]) * (len(T) - n) )
+        if self.final_state is None and final:
+            self.final_state = final[0]
+        for i in final:
+            self.pending.append( (self.final_state, i) )
+        if self.deterministic:
+            for i in range(n, len(T)):
+                table = self.succ.get(self.find(T.parent[i]))
+                if table is None:
+                    continue
+                j = table.setdefault(T.label[i], i)
+                if j != i:
+                    self.pending.append( (j, i) )
+        merged = self.merge_pending()
+
+        # Merge the nodes of merged blocks, then add the new states
+        A = self.A
+        nodes = self.block_nodes
+        for y in merged:
+            node = nodes.pop(y, None)
+            if node is None:
+                continue
+            b = self.find(y)
+            other = nodes.get(b)
+            nodes[b] = A.merge_nodes( [other, node] ) if other else node
+        self.root = A.root
+        self.stats.count('prefix_tree_states', len(T) - n)
+        for i in range(n, len(T)):
+            b = self.find(i)
+            if b not in nodes:
+                nodes[b] = A.add_node()
+            A.add_edge_mask(nodes[self.find(T.parent[i])].index, nodes[b].index, 1 << self.Σ[T.label[i]])
+        for i in final:
+            nodes[self.find(i)].is_final = True
+        return A
+
+
+    def init_blocks(self):
+        """
+        Make each state of the prefix tree a block of its own.
+        """
+        n = len(self.T)
+        self.parent = array('q', range(n))
+        self.size = array('q', [1]) * n
+
+
+    def pred_table(self, b):
+        """
+        Returns (and removes) table of predecessors of block b. For a
+        block with a single state, this is its parent in the tree.
+        """
+        T = self.pred.pop(b, None)
+        if T is None:
+            T = {self.T.label[b]: self.T.parent[b]} if b else {}
+        return T
+
+
+    def succ_table(self, b):
+        """
+        Returns (and removes) table of successors of block b.
+        """
+        T = self.succ.pop(b, None)
+        if T is None:
+            T = dict(self.T.successors(b))
+        return T
+
+
+    def merge_final_states(self):
+        final = [i for i, f in enumerate(self.T.final) if f]
+        if self.verbose:
+            print(f'Merging {len(final)} final states into one.')
+        if final:
+            self.final_state = final[0]
+        for i in final[1:]:
+            self.pending.append( (final[0], i) )
+
+
+    def find(self, i):
+        """
+        Returns representative of the block of state i (with path halving).
+        """
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+
+    def merge_pending(self):
+        """
+        Process the worklist of pending merges, until there are no blocks
+        left with nd-transitions.
+
+        :returns:
+            merged  - list of blocks that were merged into another block
+        """
+        merged = []
+        pops = 0
+        while self.pending:
+            pops += 1
+            x, y = self.pending.pop()
+            x, y = self.find(x), self.find(y)
+            if x == y:
+                continue
+            if self.size[x] < self.size[y]:
+                x, y = y, x
+            # Block y is merged into block x
+            self.parent[y] = x
+            self.size[x] += self.size[y]
+            self.pred[x] = self.merge_tables(self.pred_table(x), self.pred_table(y))
+            if self.deterministic:
+                self.succ[x] = self.merge_tables(self.succ_table(x), self.succ_table(y))
+            merged.append(y)
+        self.stats.count('worklist_pops', pops)
+        self.stats.count('merges', len(merged))
+        if self.verbose:
+            print(f'Merged {len(merged)} pairs of blocks.')
+        return merged
+
+
+    def merge_tables(self, T1, T2):
+        """
+        Merge two label tables. Labels that are in both tables lead to new
+        pending merges.
+
+        :returns:
+            T       - the merged table (one of T1 or T2)
+        """
+        if len(T1) < len(T2):
+            T1, T2 = T2, T1
+        for label, j in T2.items():
+            i = T1.get(label)
+            if i is None:
+                T1[label] = j
+            else:
+                self.pending.append( (i, j) )
+        return T1
+
+
+    def construct_automaton(self):
+        """
+        Add a node for each block to the automaton, and an edge for each
+        edge of the prefix tree.
+        """
+        T = self.T
+        A = self.A
+        nodes = self.block_nodes
+        nodes[self.find(0)] = self.root
+        for i in range(1, len(T)):
+            b = self.find(i)
+            if b not in nodes:
+                nodes[b] = A.add_node()
+        for i, f in enumerate(T.final):
+            if f:
+                nodes[self.find(i)].is_final = True
+        Σ = self.Σ
+        for i in range(1, len(T)):
+            A.add_edge_mask(nodes[self.find(T.parent[i])].index, nodes[self.find(i)].index, 1 << Σ[T.label[i]])
+
+
+# Learning engines, by name (option --engine)
+ENGINES = { 'fast': ZRLearner, 'reference': A0Learner }